@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module providing compressed storage of the test artifacts."""
+
+import gzip
+import io
+import lzma
+import os
+import shutil
+import sys
+import configureme as config
+
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "xz": ".xz", "zstd": ".zst"}
+
+def get_artifact_name(app, k_p, k_i, params=None):
+    """Function returning name of the artifacts of the test with provided servo settings."""
+    name = f"{app}_P{k_p}_I{k_i}"
+    for param, value in (params or {}).items():
+        name = name + f"_{param}{value}"
+    return name
+
+def open_zstd(filename, mode):
+    """Function opening zstd stream with the stdlib or the zstandard module."""
+    try:
+        from compression import zstd # pylint: disable=import-outside-toplevel
+        return zstd.open(filename, mode, encoding=None if "b" in mode else "utf-8")
+    except ImportError:
+        pass
+    try:
+        import zstandard # pylint: disable=import-outside-toplevel
+    except ImportError:
+        print("zstd compression requires Python 3.14 or the zstandard module")
+        sys.exit()
+    #Closing the stream closes the file as well
+    if "r" in mode:
+        stream = zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"), closefd=True)
+    else:
+        stream = zstandard.ZstdCompressor().stream_writer(open(filename, "wb"), closefd=True)
+    if "b" in mode:
+        return stream
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+def open_log(filename, mode="r"):
+    """Function opening plain or compressed log, chosen by the file suffix."""
+    text_mode = mode if "b" in mode else mode + "t"
+    encoding = None if "b" in mode else "utf-8"
+    if filename.endswith(".gz"):
+        return gzip.open(filename, text_mode, encoding=encoding)
+    if filename.endswith(".xz"):
+        return lzma.open(filename, text_mode, encoding=encoding)
+    if filename.endswith(".zst"):
+        return open_zstd(filename, mode)
+    return open(filename, mode, encoding=encoding)
+
+def find_log(filename):
+    """Function returning the existing plain or compressed variant of the log."""
+    for suffix in ("", ".gz", ".xz", ".zst"):
+        if os.path.isfile(filename + suffix):
+            return filename + suffix
+    return filename
+
+def store_log(source, destination):
+    """Function compressing the log into destination in a stream, removes the source."""
+    destination = destination + COMPRESSION_SUFFIXES[config.artifact_compression]
+    with open(source, "rb") as source_file, open_log(destination, "wb") as destination_file:
+        shutil.copyfileobj(source_file, destination_file)
+    os.remove(source)
+    return destination
+
+class ArtifactStore():
+    """Store keeping one directory of compressed artifacts per gain pair."""
+
+    def __init__(self, result_path):
+        """Init function."""
+        self.result_path = result_path
+        self.stored = set()
+
+    def add(self, path, run_name=None):
+        """Function moving the creature artifacts directory into the store."""
+        if not os.path.isdir(path):
+            return
+        name = os.path.basename(os.path.normpath(path))
+        #Only the first test of every gain pair is kept
+        if config.artifact_dedup is True and name in self.stored:
+            shutil.rmtree(path)
+            return
+        self.stored.add(name)
+        target = os.path.join(self.result_path, name)
+        os.makedirs(target, exist_ok=True)
+
+        for filename in sorted(os.listdir(path)):
+            source = os.path.join(path, filename)
+            #Logs are compressed next to the source first
+            if filename.endswith(".log") and config.artifact_compression != "none":
+                source = store_log(source, source)
+                filename = os.path.basename(source)
+            if run_name:
+                filename = filename.replace(name, run_name, 1)
+            destination = os.path.join(target, filename)
+            #Complete files appear in the store at once
+            try:
+                os.replace(source, destination)
+            except OSError:
+                shutil.move(source, destination)
+        shutil.rmtree(path)
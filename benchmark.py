@@ -0,0 +1,235 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module benchmarking convergence of the optimizer on seeded simulated landscapes."""
+
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import json
+import os
+import random
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+import numpy
+import matplotlib.pyplot as plt
+import configureme as config
+import evaluate
+import racing
+from evaluate import Creature
+from survey import get_grid
+
+SCRIPT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+#Simulator settings of each landscape, the seed fixes the rating of every gain pair
+LANDSCAPES = {"default": {"sim_seed": 1},
+              "noisy": {"sim_seed": 2, "sim_noise": 100, "sim_wander": 10},
+              "drift": {"sim_seed": 3, "sim_freq_error": 50000, "sim_wander": 20}}
+
+@contextlib.contextmanager
+def landscape_config(landscape):
+    """Context manager switching config to the simulated landscape."""
+    settings = dict(LANDSCAPES[landscape], backend="simulator", adaptive_duration=False,
+                    noise_instrumentation=False, test_repeted_creatures=False,
+                    warm_start=False, initial_values=False, graph_per_epoch=False)
+    saved = {name: getattr(config, name) for name in settings}
+    for name, value in settings.items():
+        setattr(config, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+def reset_caches():
+    """Function clearing ratings cached by the previous run."""
+    evaluate.Rating_table.clear()
+    evaluate.Objectives_table.clear()
+    evaluate.Failure_table.clear()
+    evaluate.Checked_data.clear()
+    racing.Samples.clear()
+
+def run_optimizer(seed, duration):
+    """Function running main.py once in a temporary directory, returns ratings and wall time."""
+    reset_caches()
+    numpy.random.seed(seed)
+    random.seed(seed)
+    workdir = tempfile.mkdtemp(prefix="benchmark.")
+    cwd = os.getcwd()
+    argv = sys.argv
+    start = time.monotonic()
+    try:
+        os.chdir(workdir)
+        sys.argv = ["main.py", "--t", str(duration)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            runpy.run_path(os.path.join(SCRIPT_PATH, "main.py"), run_name="__main__")
+    except SystemExit as error:
+        #main.py exits only on invalid settings
+        if error.code not in (None, 0):
+            print(f"Optimizer stopped: {error.code}")
+    finally:
+        wall_time = time.monotonic() - start
+        sys.argv = argv
+        os.chdir(cwd)
+    ratings = read_evaluations(glob.glob(os.path.join(workdir, "*", f"{config.app}.csv")))
+    shutil.rmtree(workdir, ignore_errors=True)
+    return ratings, wall_time
+
+def read_evaluations(filenames):
+    """Function returning ratings of the measured creatures in the evaluation order."""
+    ratings = []
+    seen = set()
+    for filename in filenames:
+        with open(filename, "r", encoding="utf-8") as csvfile:
+            for row in csv.DictReader(csvfile):
+                #Repeated creatures are rated from the cache, not measured
+                key = (row["k_p"], row["k_i"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                ratings.append(float(row["rating"]))
+    return ratings
+
+def get_optimum(duration, grid):
+    """Function returning the best rating on a grid of stable gains."""
+    reset_caches()
+    workdir = tempfile.mkdtemp(prefix="benchmark.")
+    work_path = evaluate.Work_path
+    evaluate.Work_path = workdir
+    best = float("inf")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for p_term, i_term in zip(*get_grid(grid)):
+                creature = Creature(float(p_term), float(i_term))
+                creature.evaluate_data(None, duration)
+                shutil.rmtree(creature.workspace, ignore_errors=True)
+                best = min(best, creature.rating)
+    finally:
+        evaluate.Work_path = work_path
+        shutil.rmtree(workdir, ignore_errors=True)
+    return best
+
+def evaluations_to_target(ratings, target):
+    """Function returning number of evaluations needed to reach the target, None if missed."""
+    for index, rating in enumerate(ratings):
+        if rating <= target:
+            return index + 1
+    return None
+
+def best_so_far(runs):
+    """Function returning mean best-so-far curve of the runs."""
+    length = max(len(ratings) for ratings in runs)
+    curves = [numpy.minimum.accumulate(ratings + [ratings[-1]] * (length - len(ratings)))
+              for ratings in runs if ratings]
+    return numpy.mean(curves, axis=0)
+
+def summarize(runs, wall_times, optimum, tolerance):
+    """Function summarizing runs of a landscape."""
+    target = optimum * (1 + tolerance)
+    evaluations = [evaluations_to_target(ratings, target) for ratings in runs]
+    reached = [count for count in evaluations if count is not None]
+    gaps = [(min(ratings) - optimum) / optimum if optimum else 0 for ratings in runs if ratings]
+    return {"optimum": optimum,
+            "success_rate": len(reached) / len(runs),
+            "evaluations": float(numpy.median(reached)) if reached else None,
+            "final_gap": float(numpy.median(gaps)) if gaps else None,
+            "wall_time": float(numpy.mean(wall_times))}
+
+def compare(summary, baseline, margin):
+    """Function comparing summary with the baseline, returns True if nothing got worse."""
+    passed = True
+    for landscape, result in summary.items():
+        if landscape not in baseline:
+            print(f"{landscape}: no baseline")
+            continue
+        reference = baseline[landscape]
+        worse = result["success_rate"] < reference["success_rate"]
+        if result["evaluations"] is not None and reference["evaluations"] is not None:
+            worse = worse or result["evaluations"] > reference["evaluations"] * (1 + margin)
+        print(f"{landscape}: evaluations {reference['evaluations']} -> {result['evaluations']},"
+              f" success rate {reference['success_rate']:.0%} -> {result['success_rate']:.0%},"
+              f" wall time {reference['wall_time']:.1f} -> {result['wall_time']:.1f} s"
+              f"{' WORSE' if worse else ''}")
+        passed = passed and not worse
+    return passed
+
+def plot_curves(curves, optimums, filename):
+    """Function plotting mean best-so-far curves relative to the optimum."""
+    plt.figure()
+    for landscape, curve in curves.items():
+        plt.plot(numpy.arange(1, len(curve) + 1), curve / optimums[landscape], label=landscape)
+    plt.xlabel("Evaluations")
+    plt.ylabel("Best rating / optimum")
+    plt.legend()
+    plt.savefig(filename)
+    plt.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimizer convergence benchmark")
+    parser.add_argument("--seeds", type=int, default=5, help="Number of seeded runs")
+    parser.add_argument("--landscapes", nargs="+", default=list(LANDSCAPES),
+                        choices=list(LANDSCAPES), help="Simulated landscapes")
+    parser.add_argument("--t", type=int, default=60, help="Simulated test duration")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="Relative distance to the optimum counted as reached")
+    parser.add_argument("--grid", type=int, default=20, help="Grid size used to find optimum")
+    parser.add_argument("--baseline", default="benchmark_baseline.json", help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store the results as the new baseline")
+    parser.add_argument("--margin", type=float, default=0.2,
+                        help="Relative increase of evaluations reported as worse")
+    parser.add_argument("--output", default="benchmark", help="Output filename prefix")
+
+    args = parser.parse_args()
+    baseline_results = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline_results = json.load(baseline_file)
+
+    results = {}
+    mean_curves = {}
+    for name in args.landscapes:
+        with landscape_config(name):
+            #The optimum of the landscape does not depend on the optimizer
+            if name in baseline_results and baseline_results[name]["optimum"] is not None:
+                optimum_rating = baseline_results[name]["optimum"]
+            else:
+                optimum_rating = get_optimum(args.t, args.grid)
+            landscape_runs = []
+            landscape_times = []
+            for run_seed in range(args.seeds):
+                run_ratings, run_time = run_optimizer(run_seed, args.t)
+                landscape_runs.append(run_ratings)
+                landscape_times.append(run_time)
+                print(f"{name} seed {run_seed}: {len(run_ratings)} evaluations, best "
+                      f"{min(run_ratings, default=float('nan'))}, optimum {optimum_rating}, "
+                      f"{run_time:.1f} s")
+        #The grid may miss the optimum found by the optimizer
+        optimum_rating = min([optimum_rating] + [min(ratings) for ratings in landscape_runs
+                                                 if ratings])
+        results[name] = summarize(landscape_runs, landscape_times, optimum_rating, args.tolerance)
+        mean_curves[name] = best_so_far(landscape_runs)
+
+    with open(f"{args.output}_curve.csv", "w", encoding="utf-8") as curve_file:
+        curve_file.write("evaluation," + ",".join(mean_curves) + "\n")
+        for row in range(max(len(curve) for curve in mean_curves.values())):
+            curve_file.write(f"{row + 1}," + ",".join(
+                str(curve[min(row, len(curve) - 1)]) for curve in mean_curves.values()) + "\n")
+    plot_curves(mean_curves, {name: results[name]["optimum"] for name in results},
+                f"{args.output}_curve.png")
+    print(json.dumps(results, indent=4))
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(results, baseline_file, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+    elif baseline_results and not compare(results, baseline_results, args.margin):
+        sys.exit(1)
@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module running ptp4l and phc2sys together and rating the CLOCK_REALTIME error."""
+
+import os
+import selectors
+import signal
+import subprocess #nosec
+import configureme as config
+import parse_ptp as parse
+import simulator
+from artifacts import store_log
+from scheduling import get_servo_prefix
+from stability import redefine_to_stable_array
+from testptp4l import reset_ptp_clock
+
+#Servo parameters with this prefix are passed to phc2sys, the others to ptp4l
+PHC2SYS_PREFIX = "phc2sys_"
+#phc2sys gains used when the genome does not carry them
+PHC2SYS_DEFAULT_GAINS = {"P": 0.7, "I": 0.3}
+
+def add_cascade_params():
+    """Function adding phc2sys gains to the genome, bounds given by gen_servo_params win."""
+    if config.stability_verification == "Complex":
+        max_kp, max_ki = config.gen_max_kp_stable_complex, config.gen_max_ki_stable
+    elif config.stability_verification == "Real":
+        max_kp, max_ki = config.gen_max_kp_stable_real, config.gen_max_ki_stable
+    else:
+        max_kp, max_ki = config.gen_max_kp, config.gen_max_ki
+    config.gen_servo_params = dict({f"{PHC2SYS_PREFIX}P": [0, max_kp, False],
+                                    f"{PHC2SYS_PREFIX}I": [0, max_ki, False]},
+                                   **config.gen_servo_params)
+
+def split_params(params):
+    """Function splitting servo parameters into ptp4l and phc2sys ones."""
+    ptp4l_params = {}
+    phc2sys_params = {}
+    for name, value in params.items():
+        if name.startswith(PHC2SYS_PREFIX):
+            phc2sys_params[name[len(PHC2SYS_PREFIX):]] = value
+        else:
+            ptp4l_params[name] = value
+    return ptp4l_params, phc2sys_params
+
+def repair_gains(params, stability_log=None):
+    """Function repairing phc2sys gains in the servo parameters array to stable, in place."""
+    names = list(config.gen_servo_params)
+    if config.app != "cascade" or f"{PHC2SYS_PREFIX}P" not in names or \
+       f"{PHC2SYS_PREFIX}I" not in names:
+        return params
+    k_p = names.index(f"{PHC2SYS_PREFIX}P")
+    k_i = names.index(f"{PHC2SYS_PREFIX}I")
+    params[:,k_p], params[:,k_i] = redefine_to_stable_array(params[:,k_p], params[:,k_i],
+                                                            stability_log)
+    return params
+
+def combine_rows(ptp4l_row, phc2sys_row):
+    """Function returning row of the CLOCK_REALTIME error against the master."""
+    #ptp4l offset is PHC - master, phc2sys offset is CLOCK_REALTIME - PHC
+    return [phc2sys_row[0], phc2sys_row[1], min(ptp4l_row[2], phc2sys_row[2]),
+            ptp4l_row[3] + phc2sys_row[3], phc2sys_row[4], phc2sys_row[5]]
+
+def format_row(row):
+    """Function formatting combined row as a phc2sys log line."""
+    kernel_sec, kernel_nsec, state, offset, freq, delay = row
+    return f"phc2sys[{kernel_sec}.{kernel_nsec // 1000000:03d}]: CLOCK_REALTIME master offset"\
+           f" {offset:>9d} s{state} freq {freq:+7d} delay {delay:>6d}\n"
+
+def read_lines(fd, pending):
+    """Function reading available output of the pipe, returns complete lines, None at the end."""
+    data = os.read(fd, 65536)
+    if not data:
+        return None
+    *lines, rest = (pending.get(fd, b"") + data).split(b"\n")
+    pending[fd] = rest
+    return [line.decode("utf-8", "replace") + "\n" for line in lines]
+
+def run_processes(commands, logs, combined_log, stop_rule=None):
+    """Function running ptp4l and phc2sys, logging both and their combined stream in one pass."""
+    selector = selectors.DefaultSelector()
+    processes = []
+    for app, command in commands.items():
+        process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, #nosec
+                                   stderr=subprocess.STDOUT, start_new_session=True)
+        processes.append(process)
+        selector.register(process.stdout.fileno(), selectors.EVENT_READ, app)
+
+    #Pipes are read without a buffer, so select reports every line not read yet
+    pending = {}
+    ptp4l_row = None
+    stopped = False
+    while selector.get_map() and not stopped:
+        for key, _ in selector.select():
+            lines = read_lines(key.fd, pending)
+            if lines is None:
+                selector.unregister(key.fd)
+                #Last line of the output may not end with a newline
+                lines = [pending.pop(key.fd).decode("utf-8", "replace") + "\n"] \
+                    if pending.get(key.fd) else []
+            for line in lines:
+                logs[key.data].write(line)
+                if key.data == "ptp4l":
+                    ptp4l_row = parse.parse_ptp4l_out(line.strip()) or ptp4l_row
+                    continue
+                phc2sys_row = parse.parse_phc2sys_out(line.strip())
+                #phc2sys samples taken before ptp4l reported the PHC offset are not rated
+                if not phc2sys_row or ptp4l_row is None:
+                    continue
+                row = combine_rows(ptp4l_row, phc2sys_row)
+                combined_log.write(format_row(row))
+                if stop_rule and stop_rule.update(row):
+                    stopped = True
+                    break
+            if stopped:
+                break
+
+    for process in processes:
+        if process.poll() is None:
+            os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+        process.stdout.close()
+    selector.close()
+
+def run_sim_cascade(P, I, phc2sys_params, timeout, logs, combined_log, stop_rule=None):
+    """Function simulating ptp4l disciplining the PHC and phc2sys following it."""
+    phc2sys_kp = phc2sys_params.get("P", PHC2SYS_DEFAULT_GAINS["P"])
+    phc2sys_ki = phc2sys_params.get("I", PHC2SYS_DEFAULT_GAINS["I"])
+    seed = simulator.get_seed(P, I)
+    phc_frequency = []
+    ptp4l_rows = simulator.simulate_servo(P, I, timeout, seed, frequency=phc_frequency)
+    phc2sys_seed = seed + simulator.get_seed(phc2sys_kp, phc2sys_ki) if seed else None
+    phc2sys_rows = simulator.simulate_servo(phc2sys_kp, phc2sys_ki, timeout, phc2sys_seed,
+                                            reference=phc_frequency)
+    for ptp4l_row, phc2sys_row in zip(ptp4l_rows, phc2sys_rows):
+        #Both servos share the timestamps of the simulated host
+        phc2sys_row[0] = ptp4l_row[0]
+        logs["ptp4l"].write(simulator.format_row("ptp4l", ptp4l_row))
+        logs["phc2sys"].write(simulator.format_row("phc2sys", phc2sys_row))
+        row = combine_rows(ptp4l_row, phc2sys_row)
+        combined_log.write(format_row(row))
+        if stop_rule and stop_rule.update(row):
+            break
+
+def run_cascade_test(interface, P, I, phc2sys_params, timeout=60, stop_rule=None,
+                     ptp4l_options="", phc2sys_options="", name="cascade", workdir="."):
+    """Run ptp4l and phc2sys together, storing both logs and the combined one."""
+    path = os.path.join(workdir, name)
+    if not os.path.exists(path):
+        os.mkdir(path)
+    filenames = {app: os.path.join(workdir, f"{app}.log") for app in ("ptp4l", "phc2sys")}
+    combined_filename = os.path.join(workdir, "cascade.log")
+
+    logs = {app: open(filename, "w", encoding="utf-8") for app, filename in filenames.items()}
+    try:
+        with open(combined_filename, "w", encoding="utf-8") as combined_log:
+            if config.backend == "simulator":
+                run_sim_cascade(P, I, phc2sys_params, timeout, logs, combined_log, stop_rule)
+            else:
+                reset_ptp_clock(interface)
+                #phc2sys follows the PHC disciplined by ptp4l
+                prefix = get_servo_prefix()
+                commands = {"ptp4l": f"timeout {timeout} {prefix}ptp4l -i {interface} -m -2 -s"
+                                     f" --tx_timestamp_timeout 100 --pi_proportional_const {P}"
+                                     f" --pi_integral_const {I} {ptp4l_options}",
+                            "phc2sys": f"timeout {timeout} {prefix}phc2sys -s {interface}"
+                                       f" -c CLOCK_REALTIME -m -O 0 -N 20 {phc2sys_options}"}
+                run_processes(commands, logs, combined_log, stop_rule)
+    finally:
+        for log in logs.values():
+            log.close()
+
+    for app, filename in filenames.items():
+        store_log(filename, os.path.join(path, f"{name}_{app}.log"))
+    parse.plot(parse.parse_file(combined_filename, 1), os.path.join(path, f"{name}.png"))
+    store_log(combined_filename, os.path.join(path, f"{name}.log"))
@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module providing CMA-ES search strategy for the servo gains and parameters."""
+
+import numpy
+import configureme as config
+from population import Population
+from population import ORIGIN_SAMPLED
+from population import get_param_bounds
+from population import round_params
+from cascade import repair_gains
+from stability import validate_stability_array
+from stability import redefine_to_stable_array
+
+#Number of times an infeasible sample is drawn again before it is repaired
+MAX_RESAMPLES = 10
+
+def get_gene_bounds():
+    """Function returning lower and upper bounds of k_p, k_i and the servo parameters."""
+    if config.stability_verification == "Complex":
+        max_kp, max_ki = config.gen_max_kp_stable_complex, config.gen_max_ki_stable
+    elif config.stability_verification == "Real":
+        max_kp, max_ki = config.gen_max_kp_stable_real, config.gen_max_ki_stable
+    else:
+        max_kp, max_ki = config.gen_max_kp, config.gen_max_ki
+    low, high = get_param_bounds()
+    return numpy.concatenate(([0, 0], low)), numpy.concatenate(([max_kp, max_ki], high))
+
+class CMAES():
+    """Covariance matrix adaptation evolution strategy over genes scaled to [0, 1]."""
+
+    def __init__(self):
+        """Init function."""
+        self.low, self.high = get_gene_bounds()
+        dimension = len(self.low)
+        self.size = config.gen_population_size
+        self.parents = self.size // 2
+        weights = numpy.log(self.parents + 0.5) - numpy.log(numpy.arange(1, self.parents + 1))
+        self.weights = weights / numpy.sum(weights)
+        self.mueff = 1 / numpy.sum(self.weights ** 2)
+
+        #Learning rates of the evolution paths, covariance and step size
+        self.cc = (4 + self.mueff / dimension) / (dimension + 4 + 2 * self.mueff / dimension)
+        self.cs = (self.mueff + 2) / (dimension + self.mueff + 5)
+        self.c1 = 2 / ((dimension + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1 - self.c1, 2 * (self.mueff - 2 + 1 / self.mueff) /
+                       ((dimension + 2) ** 2 + self.mueff))
+        self.damps = 1 + 2 * max(0, numpy.sqrt((self.mueff - 1) / (dimension + 1)) - 1) + self.cs
+        self.chi = numpy.sqrt(dimension) * (1 - 1 / (4 * dimension) + 1 / (21 * dimension ** 2))
+
+        self.mean = numpy.full(dimension, 0.5)
+        self.sigma = config.cmaes_sigma
+        self.covariance = numpy.eye(dimension)
+        self.axes = numpy.eye(dimension)
+        self.scales = numpy.ones(dimension)
+        self.path_c = numpy.zeros(dimension)
+        self.path_s = numpy.zeros(dimension)
+        self.generation = 0
+
+    def scale(self, genes):
+        """Function scaling genes to [0, 1]."""
+        return (genes - self.low) / (self.high - self.low)
+
+    def unscale(self, samples):
+        """Function scaling samples back to genes."""
+        return self.low + samples * (self.high - self.low)
+
+    def ask(self, stability_log=None):
+        """Function sampling population of the next generation."""
+        dimension = len(self.mean)
+        samples = numpy.empty((self.size, dimension))
+        missing = numpy.arange(self.size)
+        for _ in range(MAX_RESAMPLES):
+            steps = numpy.random.standard_normal((len(missing), dimension)) * self.scales
+            drawn = self.mean + self.sigma * steps @ self.axes.T
+            genes = self.unscale(drawn)
+            feasible = numpy.all((drawn >= 0) & (drawn <= 1), axis=1) & \
+                validate_stability_array(genes[:,0], genes[:,1])
+            samples[missing] = drawn
+            missing = missing[~feasible]
+            if len(missing) == 0:
+                break
+
+        #Samples still infeasible are repaired the same way as GA creatures
+        genes = self.unscale(numpy.clip(samples, 0, 1))
+        genes[:,0], genes[:,1] = redefine_to_stable_array(genes[:,0], genes[:,1], stability_log)
+        genes[:,2:] = repair_gains(round_params(genes[:,2:]), stability_log)
+        return Population(genes[:,0], genes[:,1], ORIGIN_SAMPLED, genes[:,2:])
+
+    def tell(self, population, order):
+        """Function updating the distribution from the population ordered by ranking."""
+        selected = self.scale(population.genes[order[:self.parents]])
+        old_mean = self.mean
+        self.mean = self.weights @ selected
+        self.generation = self.generation + 1
+
+        step = (self.mean - old_mean) / self.sigma
+        whitened = self.axes @ ((self.axes.T @ step) / self.scales)
+        self.path_s = (1 - self.cs) * self.path_s + \
+            numpy.sqrt(self.cs * (2 - self.cs) * self.mueff) * whitened
+        #Stall the covariance path while the step size grows fast
+        norm = numpy.linalg.norm(self.path_s) / \
+            numpy.sqrt(1 - (1 - self.cs) ** (2 * self.generation))
+        stalled = 0 if norm / self.chi < 1.4 + 2 / (len(self.mean) + 1) else 1
+        self.path_c = (1 - self.cc) * self.path_c + \
+            (1 - stalled) * numpy.sqrt(self.cc * (2 - self.cc) * self.mueff) * step
+
+        deviations = (selected - old_mean) / self.sigma
+        self.covariance = (1 - self.c1 - self.cmu) * self.covariance + \
+            self.c1 * (numpy.outer(self.path_c, self.path_c) +
+                       stalled * self.cc * (2 - self.cc) * self.covariance) + \
+            self.cmu * (deviations.T * self.weights) @ deviations
+        self.sigma = self.sigma * numpy.exp((self.cs / self.damps) *
+                                            (numpy.linalg.norm(self.path_s) / self.chi - 1))
+
+        self.covariance = (self.covariance + self.covariance.T) / 2
+        eigenvalues, self.axes = numpy.linalg.eigh(self.covariance)
+        self.scales = numpy.sqrt(numpy.maximum(eigenvalues, 1e-20))
+        if config.debug_level == 2:
+            print(f"CMA-ES mean: {self.unscale(self.mean)} sigma: {self.sigma:.4f}")
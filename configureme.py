@@ -1,14 +1,47 @@
 ### [General settings]
 # Debug level: 1 for basic, 2 for full logging
 debug_level = 1
-# Application: ptp4l, phc2sys
+# Application: ptp4l, phc2sys, cascade. Cascade runs ptp4l and phc2sys together,
+# tunes the phc2sys gains (phc2sys_P, phc2sys_I) with the ptp4l ones and rates
+# the CLOCK_REALTIME error against the master
 app = "ptp4l"
-# Metric: MSE, RMSE, MAE
+# Metric: MSE, RMSE, MAE, LOCK_TIME, SETTLING_TIME, OVERSHOOT, MTIE, TDEV
 metric = "MAE"
+# Observation windows [s] of the MTIE and TDEV metrics
+timing_windows = [1, 10, 100]
+# Limits [ns] of MTIE and TDEV per observation window. The rating is the worst
+# ratio of the metric to its limit, or the worst metric if no limits are given
+timing_limits = {"MTIE": None, "TDEV": None}
+# |offset| [ns] below which the servo is considered settled (SETTLING_TIME)
+convergence_threshold = 100
+# Port or clock rated in logs of several ports, e.g. the [tag] of multi-port
+# ptp4l ("eth0") or the clock of phc2sys ("CLOCK_REALTIME"), None for the port
+# with the most samples
+log_port = None
 # Fixed Kp, Ki values from initial_values.csv
 initial_values = False
+# If true, the initial population is seeded with the best creatures of previous
+# runs of the same app, interface and metric found by run_index.py
+warm_start = False
+# Max number of creatures taken from previous runs
+warm_start_size = 4
+# Min distance between k_p, k_i of two creatures taken from previous runs
+warm_start_min_distance = 0.05
+# Backend running the tests: hardware, simulator
+backend = "hardware"
+# Compression of the stored test logs: none, gzip, xz, zstd
+artifact_compression = "gzip"
+# If true, only the artifacts of the first test of every gain pair are stored,
+# the ones of repeated and raced tests of the pair are dropped
+artifact_dedup = False
 # If true, a graph for each epoch is generated
 graph_per_epoch = False
+# If true, the population is ranked by Pareto fronts (NSGA-II) over metric,
+# lock time and frequency noise instead of the metric only
+multi_objective = False
+# Weights of metric, lock time and frequency noise used to pick
+# the operating point from the Pareto front
+pareto_weights = [1, 1, 1]
 
 ### Servo stability verification
 # Stability verification: Complex (Complex & stable), Real (Real & stable), False
@@ -24,6 +57,12 @@ gen_max_ki_stable = 4
 reduction_determinant = 0.001
 
 ### [Genetic algorithm]
+# Search strategy creating new generations: ga, cmaes. With cmaes each new
+# generation of gen_population_size creatures is sampled by CMA-ES and the
+# crossover and mutation settings below are ignored
+strategy = "ga"
+# Initial CMA-ES step size relative to the range of each gene
+cmaes_sigma = 0.3
 # Initial population size
 gen_population_size = 8
 # Number of epochs
@@ -44,7 +83,155 @@ gen_num_replicated = 4
 gen_mutation_coef = 1
 # Number of elite chromosomes
 gen_elite_size = 1
+# Servo parameters tuned together with k_p and k_i, each mapped to
+# [min, max, integer]. Single letter names are passed as short options
+# (phc2sys -N, -R), other names as long options (ptp4l --step_threshold), e.g.
+# {"pi_proportional_scale": [0, 1, False], "servo_num_offset_values": [5, 50, True]}
+gen_servo_params = {}
+# Max mutation of the servo parameters relative to their range
+gen_param_mutation_range = 0.2
 # Set to True to retest repeated creatures or False to assign previous result
 test_repeted_creatures = False
+# Number of epochs after which islands (main.py --islands) send
+# their gen_elite_size best creatures to the next island
+island_migration_interval = 2
+
+### [Survey]
+# If true, main.py loads the response surface surveyed by survey.py for the app,
+# interface, metric and survey_duration (surveyed first if missing), seeds the
+# initial population with its best points and prunes candidates predicted worse
+# than survey_prune_factor times the elite rating
+survey = False
+# Number of k_p and k_i values of the survey grid
+survey_grid = 8
+# Duration [s] of a survey test, shorter tests keep the survey cheap
+survey_duration = 30
+# Max number of creatures of the initial population taken from the survey
+survey_seed_size = 2
+# Candidates predicted worse than this multiple of the elite rating are rated
+# with the prediction instead of being tested, None to disable pruning
+survey_prune_factor = 3
+# Directory holding the cached surveys
+survey_path = "survey"
+
+### [Racing]
+# If true, contenders for the top ranks are measured again until they are
+# statistically dominated, ratings of repeated measurements are averaged
+racing = False
+# Number of top ranks the creatures race for
+racing_top_size = 2
+# Max number of measurements of a single creature
+racing_max_evaluations = 5
+# Confidence interval coefficient (1.96 for 95%)
+racing_confidence = 1.96
+
+### [System noise]
+# If true, system counters are sampled during each test and stored in the noise file
+noise_instrumentation = False
+# Load average (1 min) per CPU above which a test is flagged as noisy, None to ignore
+noise_max_load = 0.8
+# Context switches per second above which a test is flagged as noisy, None to ignore
+noise_max_ctxt_rate = None
+# Interrupts of the tested adapter per second above which a test is flagged
+# as noisy, None to ignore
+noise_max_nic_irq_rate = None
+# Number of times a noisy test is repeated
+noise_max_retries = 1
+
+### [Failure handling]
+# Ratings of tests that failed: the servo did not lock (no_lock), linuxptp timed out
+# waiting for timestamps (timeout), the servo could not be run (subprocess_error)
+# or the log has no offset lines (empty_log)
+failure_penalties = {"no_lock": 1000000000, "timeout": 1000000000,
+                     "subprocess_error": 1000000000, "empty_log": 1000000000}
+# Number of times a failed test is repeated, tests that did not lock are not repeated
+failure_max_retries = 2
+
+### [Low jitter]
+# If true, the servo under test runs pinned to the servo CPUs with SCHED_FIFO
+# priority, the optimizer and post-processing are pinned to the other CPUs.
+# Needs chrt and taskset and root or CAP_SYS_NICE
+low_jitter = False
+# CPUs of the servo, e.g. [3], None for the CPUs isolated with isolcpus
+low_jitter_servo_cpus = None
+# SCHED_FIFO priority of the servo (1-99)
+low_jitter_priority = 80
+# CPUs of the optimizer, None for all CPUs except the servo ones
+low_jitter_orchestrator_cpus = None
+
+### [Simulator]
+# Timestamp noise of the simulated clock [ns]
+sim_noise = 20
+# Random walk of the simulated clock frequency error per second [ppb]
+sim_wander = 2
+# Max initial frequency error of the simulated clock [ppb]
+sim_freq_error = 10000
+# Max initial offset of the simulated clock [ns]
+sim_initial_offset = 1000000
+# Mean path delay of the simulated link [ns]
+sim_path_delay = 600
+# Max frequency adjustment of the simulated clock [ppb]
+sim_max_adj = 500000
+# Seed making simulated tests reproducible per gains, None for random tests
+sim_seed = None
+
+### [Adaptive test duration]
+# If true, a ptp4l test ends as soon as the confidence interval of the metric
+# is tight enough to rank the creature against the current elite
+adaptive_duration = False
+# Min duration of an adaptive test in seconds, the max duration is set by --t
+adaptive_min_duration = 30
+# Number of locked samples averaged into one batch mean of the confidence interval
+adaptive_batch_size = 10
+# Confidence interval coefficient (1.96 for 95%)
+adaptive_confidence = 1.96
+# Relative half width of the confidence interval at which the test ends
+adaptive_precision = 0.05
+
+### [Metrics]
+# Port of the local HTTP endpoint serving progress metrics in Prometheus
+# (/metrics) and JSON (/metrics.json) format, None to disable
+metrics_port = None
+# Address the metrics endpoint listens on
+metrics_host = "127.0.0.1"
+# Upper bounds [s] of the duration histogram buckets
+metrics_buckets = [0.1, 1, 10, 30, 60, 120, 300, 600, 1800]
+
+### [Distributed evaluation]
+# Address the coordinator listens on for workers (main.py --distributed),
+# "0.0.0.0" to accept workers of other hosts
+distributed_host = "127.0.0.1"
+distributed_port = 5588
+# Seconds between two heartbeats sent by a worker running a job
+distributed_heartbeat_interval = 5
+# Seconds without a message after which a job is reassigned to another worker
+distributed_heartbeat_timeout = 30
+# Number of times a lost or failed job is reassigned before the run is stopped
+distributed_max_retries = 3
+
+### [Online re-tuning daemon]
+# Log of the production servo monitored by tuning_daemon.py
+daemon_log_file = "/var/log/ptp4l.log"
+# Number of the most recent locked samples used to rate the production servo
+daemon_window = 600
+# Seconds between two checks of the production servo
+daemon_poll_interval = 60
+# Relative worsening of the production rating that triggers a local search
+daemon_degradation = 0.2
+# Maintenance window ("HH:MM", "HH:MM") in which local searches may run,
+# None when the daemon evaluates candidates on a spare port at any time
+daemon_maintenance_window = None
+# Number of candidates evaluated around the current gains in one local search
+daemon_search_size = 6
+# Max change of k_p and k_i applied to the current gains by a local search
+daemon_search_step = 0.05
+# Min relative improvement over the current gains required to apply a candidate
+daemon_min_improvement = 0.05
+# Servo config file in which pi_proportional_const and pi_integral_const are applied
+daemon_servo_config = "/etc/ptp4l.conf"
+# Command restarting the production servo after its config was changed
+daemon_restart_cmd = "systemctl restart ptp4l"
+# Seconds the production servo is given to settle before it is rated again
+daemon_settle_time = 300
 
 # [1] Measurement, Control and Communication Using IEEE 1588
@@ -11,6 +11,8 @@ import statistics as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib as plot
+from pareto import pareto_front
+from pareto import pick_operating_point
 
 def create_kp_ki_plot(k_p, k_i, numbers, filename, epoch, print_epoch):
     """Function plotting kp/ki plot."""
@@ -133,18 +135,49 @@ def graph_all(filename):
         create_kp_ki_plot(kp_set, ki_set, numbers_set, filename, epoch, True)
         create_score_plot(numbers_set, scores_set, filename, epoch, True)
 
-def create_scatter_plot(input_filename, plot_filename, metric='Metric'):
-    """Function creating scatter plot of the data."""
+def create_params_plot(input_filename, plot_filename, metric='Metric'):
+    """Function plotting rating against each gene, one subplot per gene."""
+    df = pd.read_csv(input_filename)
+    genes = [column for column in df.columns if column not in {"epoch", "creature", "rating"}]
+    figure, axes = plt.subplots(1, len(genes), figsize=(4 * len(genes), 4), squeeze=False)
+    for axis, gene in zip(axes[0], genes):
+        axis.scatter(df[gene], df['rating'], c=df['epoch'], cmap=plot.cm.viridis)
+        axis.set_xlabel(gene)
+        axis.set_ylabel(metric)
+    figure.tight_layout()
+    figure.savefig(plot_filename)
+    plt.close(figure)
+
+def create_scatter_plot(input_filename, plot_filename, metric='Metric',
+                        pareto_filename=None, weights=None, marker_size=None):
+    """Function creating scatter plot of the data, marking Pareto front if provided."""
     plt.figure()
     # Load the CSV file into a DataFrame
     df = pd.read_csv(input_filename)
 
     # Create a scatter plot
-    plt.scatter(df['k_i'], df['k_p'], c=df['rating'], cmap=plot.cm.plasma_r)
+    plt.scatter(df['k_i'], df['k_p'], c=df['rating'], cmap=plot.cm.plasma_r, s=marker_size)
     plt.colorbar(label=metric)
     plt.clim(min(df['rating']),
              (st.median(df['rating']) + (st.median(df['rating']) - min(df['rating']))))
 
+    operating_point = None
+    if pareto_filename:
+        objectives_df = pd.read_csv(pareto_filename)
+        objectives = objectives_df[['offset', 'lock_time', 'freq_noise']].to_numpy()
+        front_df = objectives_df.iloc[pareto_front(objectives)]
+        operating_point = objectives_df.iloc[pick_operating_point(objectives, weights)]
+
+        plt.scatter(front_df['k_i'], front_df['k_p'], facecolors='none',
+                    edgecolors='green', s=120, label='Pareto front')
+        plt.scatter(operating_point['k_i'], operating_point['k_p'], marker='*',
+                    color='red', s=200, label='Operating point')
+        plt.legend()
+        print(f"Operating point k_p: {operating_point['k_p']} k_i: {operating_point['k_i']}"
+              f" {metric}: {operating_point['offset']}"
+              f" lock time: {operating_point['lock_time']}"
+              f" freq noise: {operating_point['freq_noise']}")
+
     # Add labels and a title
     plt.xlabel('k_i')
     plt.ylabel('k_p')
@@ -152,9 +185,23 @@ def create_scatter_plot(input_filename, plot_filename, metric='Metric'):
     # Save the plot to the result filename
     plt.savefig(plot_filename)
 
+    return operating_point
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Stability Graph Script")
     parser.add_argument("-f", "--file", help="Path to a results file", required=True)
+    parser.add_argument("-p", "--pareto", help="Path to an objectives file to pick "\
+                        "the operating point from the Pareto front of")
+    parser.add_argument("-w", "--weights", type=float, nargs=3,
+                        help="Weights of metric, lock time and frequency noise")
+    parser.add_argument("--params", action="store_true",
+                        help="Plot rating against each gene of a params file")
 
     args=parser.parse_args()
-    graph_elite(args.file)
+    if args.params:
+        create_params_plot(args.file, args.file.replace(".csv", "_plot.png"))
+    elif args.pareto:
+        create_scatter_plot(args.file, args.file.replace(".csv", "_pareto.png"),
+                            pareto_filename=args.pareto, weights=args.weights)
+    else:
+        graph_elite(args.file)
@@ -0,0 +1,292 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module providing distributed evaluation of creatures on remote test hosts.
+
+Coordinator and workers exchange newline delimited JSON messages over TCP:
+hello (worker), job (coordinator), heartbeat, result and error (worker)."""
+
+import argparse
+import base64
+import io
+import json
+import os
+import queue
+import shutil
+import socket
+import sys
+import tarfile
+import tempfile
+import threading
+import configureme as config
+import evaluate
+import metrics
+from evaluate import Creature
+from scheduling import check_low_jitter
+from scheduling import pin_orchestrator
+
+def send_message(connection, message, lock=None):
+    """Function sending JSON message terminated with a new line."""
+    data = (json.dumps(message) + "\n").encode("utf-8")
+    if lock is None:
+        connection.sendall(data)
+        return
+    with lock:
+        connection.sendall(data)
+
+def pack_artifacts(path):
+    """Function packing the artifacts directory into base64 encoded tar.gz."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        tar.add(path, arcname=os.path.basename(path))
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+def unpack_artifacts(data, destination="."):
+    """Function unpacking artifacts directory received from a worker."""
+    with tarfile.open(fileobj=io.BytesIO(base64.b64decode(data)), mode="r:gz") as tar:
+        for member in tar.getmembers():
+            #Do not let a worker write outside of the destination, links may point anywhere
+            if os.path.isabs(member.name) or ".." in member.name.split("/") or \
+               not (member.isfile() or member.isdir()):
+                print(f"Skipping invalid artifact: {member.name}")
+                continue
+            tar.extract(member, destination)
+
+class Job():
+    """Evaluation job of a single creature."""
+
+    def __init__(self, job_id, creature, duration, elite_rating):
+        """Init function."""
+        self.job_id = job_id
+        self.creature = creature
+        self.duration = duration
+        self.elite_rating = elite_rating
+        self.attempts = 0
+        self.done = False
+        self.failed = False
+
+    def to_message(self):
+        """Function returning job message."""
+        return {"type": "job", "id": self.job_id, "k_p": self.creature.k_p,
+                "k_i": self.creature.k_i, "params": self.creature.params,
+                "duration": self.duration,
+                "elite_rating": self.elite_rating}
+
+class Coordinator():
+    """Coordinator dispatching evaluation jobs to the connected workers."""
+
+    def __init__(self, host=None, port=None):
+        """Init function."""
+        self.pending = queue.Queue()
+        self.finished = threading.Condition()
+        self.next_id = 0
+        host = config.distributed_host if host is None else host
+        port = config.distributed_port if port is None else port
+        self.server = socket.create_server((host, port))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self.accept_workers, daemon=True).start()
+        print(f"Coordinator listening on {host}:{self.port}")
+
+    def accept_workers(self):
+        """Function accepting worker connections."""
+        while True:
+            connection, address = self.server.accept()
+            threading.Thread(target=self.serve_worker, args=(connection, address),
+                             daemon=True).start()
+
+    def serve_worker(self, connection, address):
+        """Function dispatching jobs to a single worker."""
+        connection.settimeout(config.distributed_heartbeat_timeout)
+        reader = connection.makefile("r", encoding="utf-8")
+        try:
+            name = json.loads(reader.readline()).get("worker", str(address))
+        except (OSError, ValueError):
+            connection.close()
+            return
+        print(f"Worker {name} connected")
+
+        while True:
+            job = self.pending.get()
+            try:
+                send_message(connection, job.to_message())
+                result = self.wait_for_result(reader, job)
+            except (OSError, ValueError) as error:
+                print(f"Worker {name} lost ({error}), reassigning job {job.job_id}")
+                self.retry(job)
+                connection.close()
+                return
+            if result["type"] == "error":
+                print(f"Worker {name} failed job {job.job_id}: {result['message']}")
+                self.retry(job)
+                continue
+            self.complete(job, result)
+
+    def wait_for_result(self, reader, job):
+        """Function waiting for job result, heartbeats keep the job alive."""
+        while True:
+            line = reader.readline()
+            if not line:
+                raise ConnectionError("connection closed")
+            message = json.loads(line)
+            if message["type"] in {"result", "error"} and message["id"] == job.job_id:
+                return message
+
+    def retry(self, job):
+        """Function putting job back to the queue until retries are exhausted."""
+        job.attempts = job.attempts + 1
+        if job.attempts > config.distributed_max_retries:
+            with self.finished:
+                job.failed = True
+                self.finished.notify_all()
+            return
+        self.pending.put(job)
+
+    def complete(self, job, result):
+        """Function storing job result in the creature."""
+        creature = job.creature
+        creature.rating = result["rating"]
+        creature.objectives = result["objectives"]
+        creature.duration = result["duration"]
+        creature.stop_reason = result["stop_reason"]
+        creature.noise = result.get("noise", {})
+        creature.scheduling = result.get("scheduling", {})
+        creature.failure = result.get("failure")
+        metrics.inc("evaluations_total")
+        if result.get("artifact"):
+            os.makedirs(evaluate.Work_path, exist_ok=True)
+            creature.workspace = tempfile.mkdtemp(prefix=f"{creature.get_name()}.",
+                                                  dir=evaluate.Work_path)
+            unpack_artifacts(result["artifact"], creature.workspace)
+        with self.finished:
+            job.done = True
+            self.finished.notify_all()
+
+    def evaluate_creatures(self, creatures, duration, elite_rating=None, repeat=False):
+        """Function evaluating creatures on the workers, honouring the ratings cache."""
+        jobs = []
+        cache_indexes = []
+        repeated = []
+        for creature in creatures:
+            cache_index = len(evaluate.Rating_table) + len(jobs)
+            if config.test_repeted_creatures is False and not repeat:
+                repeated_data = creature.validate_data()
+                cache_index = repeated_data - 1 if repeated_data else \
+                    len(evaluate.Checked_data) - 1
+                #Gains failed by the host in the previous epochs are tested again
+                if repeated_data and (evaluate.is_cached(cache_index) or
+                                      cache_index >= len(evaluate.Rating_table) or
+                                      cache_index in cache_indexes):
+                    metrics.inc("cache_hits_total")
+                    repeated.append((creature, cache_index))
+                    continue
+            jobs.append(Job(self.next_id, creature, duration, elite_rating))
+            cache_indexes.append(cache_index)
+            self.next_id = self.next_id + 1
+            self.pending.put(jobs[-1])
+
+        with self.finished:
+            self.finished.wait_for(lambda: all(job.done or job.failed for job in jobs))
+
+        measured = {}
+        for job, cache_index in zip(jobs, cache_indexes):
+            #Jobs lost by every worker are rated as failed tests, the run goes on
+            if job.failed:
+                creature = job.creature
+                creature.failure = "subprocess_error"
+                creature.rating = config.failure_penalties[creature.failure]
+                creature.objectives = [creature.rating] * 3 \
+                    if config.multi_objective is True else []
+                creature.duration = 0
+                creature.stop_reason = "failed"
+                metrics.inc("failures_total", reason=creature.failure)
+                print(f"Job {job.job_id} (k_p: {creature.k_p} k_i: {creature.k_i})"\
+                      f" failed {job.attempts} times, penalty: {creature.rating}")
+            if not repeat:
+                evaluate.store_rating(cache_index, job.creature)
+            measured[cache_index] = job.creature
+
+        for creature, cache_index in repeated:
+            print("Distributed.py: Repeated data!")
+            creature.load_rating(cache_index)
+            #Creatures repeated within the epoch share the test, failed ones too
+            if cache_index in measured:
+                source = measured[cache_index]
+                creature.rating = source.rating
+                creature.objectives = source.objectives
+                creature.failure = source.failure
+
+def send_heartbeats(connection, lock, stop):
+    """Function sending heartbeats until the job is finished."""
+    while not stop.wait(config.distributed_heartbeat_interval):
+        try:
+            send_message(connection, {"type": "heartbeat"}, lock)
+        except OSError:
+            return
+
+def run_job(message, interface):
+    """Function evaluating the job on the local interface."""
+    #Every job is a fresh measurement, the coordinator keeps the ratings cache
+    evaluate.Rating_table.clear()
+    evaluate.Checked_data.clear()
+    evaluate.Objectives_table.clear()
+    evaluate.Failure_table.clear()
+
+    creature = Creature(message["k_p"], message["k_i"], message.get("params"))
+    creature.evaluate_data(interface, message["duration"], message["elite_rating"])
+
+    path = creature.get_artifact_path()
+    artifact = None
+    if os.path.isdir(path):
+        artifact = pack_artifacts(path)
+    if creature.workspace:
+        shutil.rmtree(creature.workspace)
+    return {"type": "result", "id": message["id"], "rating": creature.rating,
+            "objectives": creature.objectives, "duration": creature.duration,
+            "stop_reason": creature.stop_reason, "noise": creature.noise,
+            "scheduling": creature.scheduling, "failure": creature.failure,
+            "artifact": artifact}
+
+def run_worker(address, interface):
+    """Function running worker until the coordinator closes the connection."""
+    host, port = address.rsplit(":", 1)
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    lock = threading.Lock()
+    with socket.create_connection((host, int(port))) as connection:
+        send_message(connection, {"type": "hello", "worker": name}, lock)
+        reader = connection.makefile("r", encoding="utf-8")
+        for line in reader:
+            message = json.loads(line)
+            if message["type"] != "job":
+                continue
+
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=send_heartbeats, args=(connection, lock, stop),
+                                         daemon=True)
+            heartbeat.start()
+            try:
+                result = run_job(message, interface)
+            except (SystemExit, OSError, ValueError, IndexError) as error:
+                result = {"type": "error", "id": message["id"], "message": repr(error)}
+            finally:
+                stop.set()
+                heartbeat.join()
+            send_message(connection, result, lock)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed evaluation worker")
+    parser.add_argument("--coordinator", required=True, help="Coordinator address HOST:PORT")
+    parser.add_argument("--i", type=str, help="Interface")
+
+    args = parser.parse_args()
+    if config.low_jitter is True:
+        low_jitter_error = check_low_jitter()
+        if low_jitter_error:
+            print(low_jitter_error)
+            sys.exit()
+        pin_orchestrator()
+    if config.metrics_port is not None:
+        metrics.start_server()
+    run_worker(args.coordinator, args.i)
@@ -9,114 +9,352 @@
 #     https://spdx.org/licenses/GPL-2.0-or-later.html
 """GA for PID in PTP."""
 
+import glob
+import os
+import shutil
 import subprocess #nosec
 from shlex import split
-import sys
+import tempfile
+from time import monotonic
+import numpy
 from sklearn.metrics import mean_squared_error
 from sklearn.metrics import mean_absolute_error
 import configureme as config
+import metrics
 import testptp4l
+import simulator
+import cascade
+from stopping import AdaptiveStop
+from system_noise import NoiseSampler
+from scheduling import get_scheduling
+from scheduling import get_servo_prefix
+import parse_ptp
+from artifacts import find_log
+from artifacts import open_log
+from artifacts import get_artifact_name
+from timing_metrics import rate_timing
+from timing_metrics import get_sample_interval
+
+SCRIPT_PATH = os.path.dirname(os.path.abspath(__file__))
 
 Rating_table = []
+Objectives_table = []
+Failure_table = []
 Checked_data = []
 Master_offset = []
+#Directory holding the workspaces of the running tests
+Work_path = "."
+CONVERGENCE_METRICS = {"LOCK_TIME": "lock_time",
+                       "SETTLING_TIME": "settling_time",
+                       "OVERSHOOT": "overshoot"}
+TIMING_METRICS = {"MTIE", "TDEV"}
+#Failures of tests rated with the penalty ratings
+FAILURES = ("no_lock", "timeout", "subprocess_error", "empty_log")
+#Failures caused by the host rather than the gains, their ratings are not cached
+TRANSIENT_FAILURES = {"timeout", "subprocess_error", "empty_log"}
 
 class Creature():
     """Creature class."""
     rating = 0
+    noise = {}
+    scheduling = {}
+    failure = None
+    workspace = None
 
-    def __init__(self, k_p, k_i):
+    def __init__(self, k_p, k_i, params=None):
         """Init function."""
         self.k_p = k_p
         self.k_i = k_i
+        self.params = params or {}
         self.rating = 0
+        self.objectives = []
+        self.convergence = {}
+        self.duration = 0
+        self.stop_reason = ""
+        self.noise = {}
+        self.scheduling = {}
+        self.failure = None
+        self.workspace = None
 
     def mutate(self, new_k_p, new_k_i):
         """Function mutating data."""
         self.k_p = new_k_p
         self.k_i = new_k_i
 
-    def evaluate_data(self, interface, time):
+    def evaluate_data(self, interface, time, elite_rating=None, repeat=False):
         """Function evaluationg data."""
         #Check if a creature with provided k_p and k_i was already tested
         #If test_repeated_creatures is set to True test it again.
         #If test_repeated_creatures is set to False assign previous result
-        if config.test_repeted_creatures is False:
+        #Repeated measurements (racing) bypass the cache
+        cache_index = len(Rating_table)
+        if config.test_repeted_creatures is False and not repeat:
             repeated_data = self.validate_data()
-            if repeated_data:
+            cache_index = repeated_data - 1 if repeated_data else len(Checked_data) - 1
+            if repeated_data and is_cached(cache_index):
                 print("Evaluate.py: Repeated data!")
-                self.rating = Rating_table[repeated_data - 1]
+                metrics.inc("cache_hits_total")
+                self.load_rating(cache_index)
                 return
 
+        start = monotonic()
+        #Failed tests are repeated before the penalty is assigned
+        for failure_attempt in range(config.failure_max_retries + 1):
+            stop_rule = self.measure(interface, time, elite_rating)
+            result_array = None
+            if self.failure is None:
+                result_array = self.get_data_from_file()
+                self.failure = self.get_failure(result_array)
+            #Gains which did not lock are not expected to lock in the next test
+            if self.failure in {None, "no_lock"} or failure_attempt == config.failure_max_retries:
+                break
+            metrics.inc("failed_retries_total", reason=self.failure)
+            print(f"Failed test ({self.failure}), repeating ", end="", flush=True)
+            shutil.rmtree(self.workspace, ignore_errors=True)
+
+        if stop_rule:
+            self.duration = stop_rule.duration
+            self.stop_reason = stop_rule.reason
+            print(f"Stopped after {self.duration} s ({self.stop_reason}) ", end="")
+        else:
+            self.duration = time
+            self.stop_reason = "timeout"
+        rating_start = monotonic()
+
+        if self.failure is not None:
+            rating = config.failure_penalties[self.failure]
+            print(f"Failed test ({self.failure}), penalty: {rating}")
+            metrics.inc("failures_total", reason=self.failure)
+            self.objectives = [rating] * 3 if config.multi_objective is True else []
+        else:
+            #Transient samples before the servo locked are not rated
+            lock_index = self.convergence["lock_index"]
+            stripped_master_offset = Master_offset[lock_index or 0:]
+
+            if config.debug_level != 1:
+                print("\nEvaluate.py: Master offset:")
+                for offset in enumerate(Master_offset):
+                    print(offset)
+                print("\nEvaluate.py: Stripped master offset:")
+                for offset in enumerate(stripped_master_offset):
+                    print(offset)
+
+            if config.metric in CONVERGENCE_METRICS:
+                rating = rate_convergence(self.convergence)
+            else:
+                rating = rate_data(stripped_master_offset,
+                                   sample_interval=get_sample_interval(result_array))
+
+            if config.multi_objective is True:
+                self.objectives = rate_objectives(result_array, rating, self.convergence)
+        self.rating = rating
+        if not repeat:
+            store_rating(cache_index, self)
+        metrics.observe("phase_duration_seconds", monotonic() - rating_start, phase="rating")
+        metrics.observe("evaluation_duration_seconds", monotonic() - start)
+        metrics.inc("evaluations_total")
+
+    def measure(self, interface, time, elite_rating=None):
+        """Function running the test in a new workspace, returns the stop rule."""
+        #Tests overlapping with other host activity are repeated
+        for attempt in range(config.noise_max_retries + 1):
+            #Adaptive duration is available for the offset metrics of ptp4l, cascade and simulator
+            stop_rule = None
+            if config.adaptive_duration is True and \
+               (config.app in {"ptp4l", "cascade"} or config.backend == "simulator") and \
+               config.metric not in CONVERGENCE_METRICS and \
+               config.metric not in TIMING_METRICS:
+                stop_rule = AdaptiveStop(elite_rating)
+
+            #Every test runs in its own workspace, so tests may run concurrently
+            os.makedirs(Work_path, exist_ok=True)
+            self.workspace = tempfile.mkdtemp(prefix=f"{self.get_name()}.", dir=Work_path)
+            test_start = monotonic()
+            if config.noise_instrumentation is not True:
+                self.failure = self.run_test(interface, time, stop_rule)
+                metrics.observe("phase_duration_seconds", monotonic() - test_start, phase="test")
+                break
+            sampler = NoiseSampler(interface)
+            self.failure = self.run_test(interface, time, stop_rule)
+            self.noise = sampler.stop()
+            metrics.observe("phase_duration_seconds", monotonic() - test_start, phase="test")
+            #Failed tests are not repeated because of the noise
+            if self.failure or not self.noise["noisy"] or attempt == config.noise_max_retries:
+                break
+            metrics.inc("noisy_retries_total")
+            print(f"Noisy test (load {self.noise['load']}, context switches "
+                  f"{self.noise['ctxt_rate']}/s), repeating ", end="", flush=True)
+            shutil.rmtree(self.workspace, ignore_errors=True)
+        self.scheduling = get_scheduling()
+        return stop_rule
+
+    def get_failure(self, result_array):
+        """Function classifying failed test, None if the servo locked."""
+        if len(result_array) == 0:
+            failure = "empty_log"
+        elif self.convergence["lock_index"] is None:
+            failure = "no_lock"
+        else:
+            return None
+        #Timestamp timeouts reported by linuxptp explain the missing samples
+        for filename in glob.glob(os.path.join(self.get_artifact_path(), "*.log*")):
+            with open_log(filename) as log:
+                if any(testptp4l.TIMEOUT_MESSAGE in line for line in log):
+                    return "timeout"
+        return failure
+
+    def run_test(self, interface, time, stop_rule=None):
+        """Function running the test of the creature with the selected backend, returns failure."""
         try:
-            if config.app == "phc2sys":
+            if config.app == "cascade":
+                ptp4l_params, phc2sys_params = cascade.split_params(self.params)
+                cascade.run_cascade_test(interface, self.k_p, self.k_i, phc2sys_params, time,
+                                         stop_rule, format_servo_options(ptp4l_params),
+                                         format_servo_options(phc2sys_params),
+                                         self.get_name(), self.workspace)
+            elif config.backend == "simulator":
+                simulator.run_sim_test(config.app, self.k_p, self.k_i, time, stop_rule,
+                                       self.get_name(), self.workspace)
+            elif config.app == "phc2sys":
                 subprocess.check_call(
-                        split(f'./test-phc2sys.sh -s {interface} -c CLOCK_REALTIME'\
-                                f' -P {self.k_p} -I {self.k_i} -t {time}'))
+                        split(f'{SCRIPT_PATH}/test-phc2sys.sh -s {interface} -c CLOCK_REALTIME'\
+                                f' -P {self.k_p} -I {self.k_i} -t {time} -d {self.get_name()}')
+                        + ["-e", format_servo_options(self.params), "-w", get_servo_prefix()],
+                        cwd=self.workspace)
             elif config.app == "ptp4l":
-                testptp4l.run_ptp_test(interface, P=self.k_p, I=self.k_i, timeout=time)
-        except subprocess.SubprocessError:
+                testptp4l.run_ptp_test(interface, P=self.k_p, I=self.k_i, timeout=time,
+                                       stop_rule=stop_rule,
+                                       servo_options=format_servo_options(self.params),
+                                       name=self.get_name(), workdir=self.workspace)
+        except (subprocess.SubprocessError, OSError) as error:
             if config.app == "phc2sys":
-                print("Error calling phc2sys")
+                print(f"Error calling phc2sys: {error}")
             elif config.app == "ptp4l":
-                print("Error calling ptp4l")
-            sys.exit()
-        self.get_data_from_file()
-
-        stripped_master_offset = Master_offset[2::]
-
-        if config.debug_level != 1:
-            print("\nEvaluate.py: Master offset:")
-            for offset in enumerate(Master_offset):
-                print(offset)
-            print("\nEvaluate.py: Stripped master offset:")
-            for offset in enumerate(stripped_master_offset):
-                print(offset)
-
-        #Calculate MSE
-        if config.metric=="MSE":
-            rating = rate_data_mse(stripped_master_offset)
-        #Calculate RMSE
-        elif config.metric=="RMSE":
-            rating = rate_data_rmse(stripped_master_offset)
-        #Calculate MAE
-        elif config.metric=="MAE":
-            rating = rate_data_mae(stripped_master_offset)
-        Rating_table.append(rating)
-
-        self.rating = rating
+                print(f"Error calling ptp4l: {error}")
+            elif config.app == "cascade":
+                print(f"Error calling ptp4l and phc2sys: {error}")
+            #Tests which left a log are classified by the log, not by the exit code
+            if not os.path.isfile(self.get_log_filename()):
+                return "subprocess_error"
+            return self.get_failure(self.get_data_from_file())
+        return None
 
     def validate_data(self):
         """Function validating data."""
         if len(Checked_data) > 0:
             cntr = 1
             for creature in Checked_data:
-                if(creature.k_p == self.k_p and creature.k_i == self.k_i):
+                if(creature.k_p == self.k_p and creature.k_i == self.k_i and
+                   creature.params == self.params):
                     return cntr
                 cntr = cntr + 1
 
-        Checked_data.append(Creature(self.k_p, self.k_i))
+        Checked_data.append(Creature(self.k_p, self.k_i, dict(self.params)))
         return 0
 
+    def load_rating(self, index):
+        """Function assigning the cached rating instead of testing the creature."""
+        self.rating = Rating_table[index]
+        self.objectives = Objectives_table[index]
+        self.failure = Failure_table[index]
+        self.duration = 0
+        self.stop_reason = "repeated"
+        self.workspace = None
+
+    def get_name(self):
+        """Function returning name of the artifacts of the creature."""
+        return get_artifact_name(config.app, self.k_p, self.k_i, self.params)
+
+    def get_artifact_path(self):
+        """Function returning artifacts directory of the last test of the creature."""
+        return os.path.join(self.workspace or ".", self.get_name())
+
+    def get_log_filename(self):
+        """Function returning name of the log file of the creature."""
+        if config.app in {"phc2sys", "ptp4l", "cascade"}:
+            return find_log(os.path.join(self.get_artifact_path(), f"{self.get_name()}.log"))
+        return "filename"
+
+    def commit_artifacts(self, store, run_name=None):
+        """Function moving artifacts of the last test into the store, removes the workspace."""
+        if self.workspace is None:
+            return
+        store.add(self.get_artifact_path(), run_name)
+        shutil.rmtree(self.workspace, ignore_errors=True)
+        self.workspace = None
+
     def get_data_from_file(self):
-        """Function getting master offset from file."""
+        """Function getting master offset and convergence metrics from file."""
         Master_offset.clear()
-        if config.app == "phc2sys":
-            file_name = f"phc2sys_P{self.k_p}_I{self.k_i}/phc2sys_P{self.k_p}_I{self.k_i}.log"
-        elif config.app == "ptp4l":
-            file_name = f"ptp4l_P{self.k_p}_I{self.k_i}/ptp4l_P{self.k_p}_I{self.k_i}.log"
-        else:
-            file_name = "filename"
+        self.convergence = {}
+        result_array = numpy.atleast_2d(parse_ptp.parse_file(self.get_log_filename(),
+                                                             convergence=self.convergence,
+                                                             threshold=config.convergence_threshold,
+                                                             port=config.log_port))
+        Master_offset.extend(result_array[:,3].astype(int).tolist())
+
+        return result_array
+
+def is_cached(index):
+    """Function checking if rating of the checked creature of the index is cached."""
+    return index < len(Rating_table) and Rating_table[index] is not None
+
+def store_rating(index, creature):
+    """Function caching rating of the creature, tests failed by the host are tested again."""
+    entry = (creature.rating, creature.objectives, creature.failure)
+    if creature.failure in TRANSIENT_FAILURES:
+        entry = (None, None, None)
+    if index == len(Rating_table):
+        Rating_table.append(entry[0])
+        Objectives_table.append(entry[1])
+        Failure_table.append(entry[2])
+    else:
+        Rating_table[index], Objectives_table[index], Failure_table[index] = entry
+
+def format_servo_options(params):
+    """Function formatting servo parameters as command line options."""
+    #Single letter parameters are short options, e.g. phc2sys -N and -R
+    return " ".join(f"-{name} {value}" if len(name) == 1 else f"--{name} {value}"
+                    for name, value in params.items())
+
+def rate_freq_noise(result_array, lock_index):
+    """Function calculating standard deviation of frequency adjustment after lock."""
+    return round(float(numpy.std(result_array[lock_index or 0:,4])), 3)
+
+def rate_convergence(convergence, metric=None):
+    """Function rating data with the selected convergence metric."""
+    if metric is None:
+        metric = config.metric
+    rating = convergence[CONVERGENCE_METRICS[metric]]
+    print(f"{metric}: {rating:.3f}")
+    return rating
 
-        with open(file_name, 'r', encoding="utf-8") as read_file:
-            for line in read_file:
-                splitted = line.split()
-                if config.app == "phc2sys":
-                    Master_offset.append(splitted[4])
-                elif config.app == "ptp4l":
-                    Master_offset.append(splitted[3])
+def rate_objectives(result_array, rating, convergence):
+    """Function calculating objectives used by the multi-objective optimization."""
+    lock_time = convergence["lock_time"]
+    freq_noise = rate_freq_noise(result_array, convergence["lock_index"])
+    print(f"Lock time: {lock_time:.3f} Freq noise: {freq_noise:.3f}")
+    return [rating, lock_time, freq_noise]
 
-        return Master_offset
+def rate_data(data, metric=None, sample_interval=1):
+    """Function rating data with the selected metric."""
+    if metric is None:
+        metric = config.metric
+    #Calculate MTIE or TDEV
+    if metric in TIMING_METRICS:
+        rating = rate_timing(data, metric, sample_interval)
+        print(f"{metric}: {rating:.3f}")
+        return rating
+    #Calculate MSE
+    if metric=="MSE":
+        return rate_data_mse(data)
+    #Calculate RMSE
+    if metric=="RMSE":
+        return rate_data_rmse(data)
+    #Calculate MAE
+    if metric=="MAE":
+        return rate_data_mae(data)
+    raise ValueError(f"Unknown metric: {metric}")
 
 def rate_data_mse(data):
     """Function calculationg MSE."""
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module ingesting linuxptp logs of any known format into column arrays per port."""
+
+import argparse
+import datetime
+import re
+import numpy
+from artifacts import open_log
+
+#Characters of the log read and matched at once, cut at the last full line
+CHUNK_SIZE = 1 << 24
+#Columns of the rows, the same as of the parse_ptp rows
+COLUMNS = ("sec", "nsec", "state", "offset", "freq", "delay")
+
+#Parts preceding the message of every format: journal or syslog prefix, [sec.frac]
+#uptime printed with -m, [tag] of message_tag or multi-port instances and name of
+#the clock or port, e.g. CLOCK_REALTIME of phc2sys
+PREFIX = r'(?P<prefix>[^\n]*?)(?:\[\s*(?P<sec>\d+)\.(?P<frac>\d+)\]:?\s*)?' \
+         r'(?:\[(?!\d+\])(?P<tag>[^\]\n]+)\]:?\s*)?(?:(?P<clock>[^\s\[\]:]+)\s+)?'
+#Prefix of the -m output, e.g. ptp4l[145810.411]: [eth0], matched without backtracking
+#over the line, the other lines with the keyword are matched with PREFIX
+FAST_PREFIX = r'(?P<prefix>[\w.-]+)\[(?P<sec>\d+)\.(?P<frac>\d+)\]:\s+' \
+              r'(?:\[(?P<tag>[^\]\n]+)\]\s+)?(?:(?P<clock>[^\s\[\]:]+)\s+)?'
+
+#Timestamps looked up in the prefix of lines without the uptime
+PREFIX_UPTIME = re.compile(r'\[\s*(\d+)\.(\d+)\]')
+PREFIX_ISO = re.compile(r'(\d{4}-\d\d-\d\d)[T ](\d\d:\d\d:\d\d)(?:[.,](\d+))?')
+PREFIX_SYSLOG = re.compile(r'([A-Z][a-z]{2})\s+(\d+)\s+(\d\d:\d\d:\d\d)')
+
+#Compiled patterns, keyword and fixed servo state of the registered formats
+Formats = {}
+
+def register_format(name, keyword, pattern, state=None):
+    """Function registering format of the message following the common prefix.
+
+    The message starts with the keyword, the pattern names the offset and freq groups,
+    optionally the state and delay ones, formats without the state group report
+    the given state."""
+    #Lines without the keyword are skipped before the prefix is matched
+    Formats[name] = (re.compile(rf'^(?:{FAST_PREFIX}{keyword}{pattern}'
+                                rf'|(?=[^\n]*?{keyword})(?P<line>[^\n]*))', re.MULTILINE),
+                     re.compile(rf'^(?=[^\n]*?{keyword}){PREFIX}{keyword}{pattern}', re.MULTILINE),
+                     re.compile(keyword), state)
+
+# ptp4l[145810.411]: master offset -24 s2 freq -27 path delay 642
+# phc2sys[689991.253]: CLOCK_REALTIME phc offset 33 s2 freq -5355 delay 603
+register_format("offset", r'(?:master|phc|sys) offset',
+                r'\s+(?P<offset>-?\d+)\s+s(?P<state>\d)\s+freq\s+(?P<freq>[+-]?\d+)'
+                r'(?:\s+(?:path\s+)?delay\s+(?P<delay>-?\d+))?')
+# ptp4l[145810.411]: rms 12 max 25 freq -27 +/- 9 delay 642 +/- 2
+#Summaries are printed with summary_interval only once the servo is locked
+register_format("rms", r'rms\s', r'\s*(?P<offset>\d+)\s+max\s+\d+\s+freq\s+(?P<freq>[+-]?\d+)'
+                       r'\s+\+/-\s+\d+(?:\s+(?:path\s+)?delay\s+(?P<delay>-?\d+)\s+\+/-\s+\d+)?',
+                state=2)
+
+def get_prefix_time(prefix, index):
+    """Function returning seconds and nanoseconds found in the prefix, index if there are none."""
+    found = PREFIX_UPTIME.search(prefix)
+    if found:
+        return int(found.group(1)), int(found.group(2).ljust(9, "0")[:9])
+    found = PREFIX_ISO.search(prefix)
+    if found:
+        stamp = datetime.datetime.strptime(f"{found.group(1)} {found.group(2)}",
+                                           "%Y-%m-%d %H:%M:%S")
+        return int(stamp.replace(tzinfo=datetime.timezone.utc).timestamp()), \
+            int((found.group(3) or "0").ljust(9, "0")[:9])
+    found = PREFIX_SYSLOG.search(prefix)
+    if found:
+        #Syslog prefix has no year, seconds are counted from the beginning of a year
+        stamp = datetime.datetime.strptime(" ".join(found.groups()), "%b %d %H:%M:%S")
+        return int((stamp - datetime.datetime(stamp.year, 1, 1)).total_seconds()), 0
+    #Lines without any timestamp are assumed to be one second apart
+    return index, 0
+
+def parse_line(line):
+    """Function parsing single line of any format, returns row or empty list."""
+    for _, pattern, _, state in Formats.values():
+        found = pattern.match(line)
+        if not found:
+            continue
+        if found.group("sec"):
+            sec, nsec = int(found.group("sec")), int(found.group("frac").ljust(9, "0")[:9])
+        else:
+            sec, nsec = get_prefix_time(found.group("prefix"), 0)
+        groups = found.groupdict()
+        return [sec, nsec, int(groups.get("state") or state), int(found.group("offset")),
+                int(found.group("freq")), int(groups.get("delay") or 0)]
+    return []
+
+def to_array(values, default="0"):
+    """Function converting strings of integers to array, empty ones to the default."""
+    if "" in values:
+        values = [value or default for value in values]
+    #Parsing the joined column is several times faster than converting every string
+    return numpy.fromstring(" ".join(values), dtype=numpy.int64, sep=" ")
+
+def get_rows(columns, state, count):
+    """Function converting matched columns to rows and names of their ports."""
+    rows = numpy.empty((len(columns["offset"]), len(COLUMNS)), dtype=numpy.int64)
+    rows[:,0] = to_array(columns["sec"])
+    #Fraction of any length is scaled to nanoseconds
+    digits = numpy.fromiter(map(len, columns["frac"]), dtype=numpy.int64, count=len(rows))
+    rows[:,1] = to_array(columns["frac"]) * 10 ** numpy.maximum(9 - digits, 0) // \
+        10 ** numpy.maximum(digits - 9, 0)
+    if "" in columns["sec"]:
+        for index in [index for index, sec in enumerate(columns["sec"]) if not sec]:
+            rows[index,:2] = get_prefix_time(columns["prefix"][index], count + index)
+    rows[:,2] = to_array(columns["state"]) if "state" in columns else state
+    rows[:,3] = to_array(columns["offset"])
+    rows[:,4] = to_array(columns["freq"])
+    rows[:,5] = to_array(columns["delay"])
+    ports = numpy.char.strip(numpy.char.add(numpy.char.add(columns["tag"], ":"),
+                                            columns["clock"]), ":")
+    return rows, ports
+
+def parse_text(text, parts, count=0):
+    """Function appending rows of every port of the text to parts, returns number of rows."""
+    for name, (fast, pattern, keyword, state) in Formats.items():
+        #Formats missing in the text are not matched line by line
+        if not keyword.search(text):
+            continue
+        matches = fast.findall(text)
+        line = fast.groupindex["line"] - 1
+        others = [match[line] for match in matches if match[line]]
+        if others:
+            matches = [match for match in matches if not match[line]]
+        sources = [(name, fast, matches), (f"{name} prefixed", pattern,
+                                           pattern.findall("\n".join(others)) if others else [])]
+        for source, source_pattern, source_matches in sources:
+            if not source_matches:
+                continue
+            rows, ports = get_rows(dict(zip(source_pattern.groupindex, zip(*source_matches))),
+                                   state, count)
+            for port in numpy.unique(ports):
+                parts.setdefault(str(port), []).append((source, rows[ports == port]))
+            count = count + len(rows)
+    return count
+
+def read_ports(filename, start=0):
+    """Function reading plain or compressed log from the start, returns rows of every port."""
+    parts = {}
+    count = 0
+    remainder = ""
+    with open_log(filename) as log:
+        log.seek(start)
+        for block in iter(lambda: log.read(CHUNK_SIZE), ""):
+            block = remainder + block
+            end = block.rfind("\n") + 1
+            remainder = block[end:]
+            count = parse_text(block[:end], parts, count)
+    parse_text(remainder, parts, count)
+
+    ports = {}
+    for port, arrays in parts.items():
+        rows = numpy.concatenate([array for _, array in arrays])
+        #Rows of different formats or prefixes are interleaved back by time
+        if len({name for name, _ in arrays}) > 1:
+            rows = rows[numpy.lexsort((rows[:,1], rows[:,0]))]
+        ports[port] = rows
+    return ports
+
+def select_port(ports, port=None):
+    """Function returning rows of the port, the one with the most rows if not given.
+
+    Rows of no port or of a port missing from the log are empty."""
+    if port is None and ports:
+        return max(ports.values(), key=len)
+    if port not in ports:
+        if ports:
+            print(f"Port {port} not found in the log, found: "
+                  f"{', '.join(f'{name!r}' for name in ports)}")
+        return numpy.empty((0, len(COLUMNS)), dtype=numpy.int64)
+    return ports[port]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ports and formats found in linuxptp logs")
+    parser.add_argument("input", nargs="+", help="Log files")
+
+    args = parser.parse_args()
+    for log_filename in args.input:
+        for port_name, port_rows in read_ports(log_filename).items():
+            locked = numpy.isin(port_rows[:,2], (2, 3))
+            print(f"{log_filename} {port_name!r}: {len(port_rows)} rows, "
+                  f"{numpy.count_nonzero(locked)} locked")
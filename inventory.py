@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module providing cached inventory of network interfaces and PTP hardware clocks."""
+
+import argparse
+import os
+import subprocess #nosec
+
+NET_PATH = "/sys/class/net"
+
+#Interfaces discovered in this run, filled once by get_devices()
+Devices = {}
+#Timestamping capabilities of the interfaces, filled on first use
+Capabilities = {}
+
+def read_phc_index(interface):
+    """Function reading PHC index of the interface from sysfs."""
+    ptp_path = os.path.join(NET_PATH, interface, "device", "ptp")
+    if os.path.isdir(ptp_path):
+        for name in sorted(os.listdir(ptp_path)):
+            if name.startswith("ptp") and name[3:].isdigit():
+                return int(name[3:])
+    return None
+
+def read_driver(interface):
+    """Function reading driver name of the interface from sysfs."""
+    driver = os.path.join(NET_PATH, interface, "device", "driver")
+    if os.path.exists(driver):
+        return os.path.basename(os.path.realpath(driver))
+    return None
+
+def read_ethtool(interface):
+    """Function returning PHC index and timestamping capabilities reported by ethtool."""
+    try:
+        output = subprocess.check_output(["ethtool", "-T", interface],
+                                         stderr=subprocess.STDOUT, universal_newlines=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None, []
+    phc = None
+    capabilities = []
+    section = None
+    for line in output.split("\n"):
+        parts = line.strip().split()
+        if not line.startswith(("\t", " ")):
+            section = line.strip()
+        if "PTP Hardware Clock:" in line and len(parts) >= 4 and parts[3].lstrip("-").isdigit():
+            phc = int(parts[3]) if int(parts[3]) >= 0 else None
+        elif section == "Capabilities:" and parts and line.startswith(("\t", " ")):
+            #Lines like "hardware-transmit (SOF_TIMESTAMPING_TX_HARDWARE)"
+            capabilities.append(parts[0])
+    return phc, capabilities
+
+def get_devices(refresh=False):
+    """Function returning interfaces with their PHC index and driver, scanned once per run."""
+    if Devices and not refresh:
+        return Devices
+    Devices.clear()
+    Capabilities.clear()
+    for interface in sorted(os.listdir(NET_PATH)):
+        Devices[interface] = {"phc": read_phc_index(interface), "driver": read_driver(interface)}
+    return Devices
+
+def get_interfaces():
+    """Function returning names of all interfaces."""
+    return list(get_devices())
+
+def get_capabilities(interface):
+    """Function returning timestamping capabilities of the interface."""
+    if interface not in Capabilities:
+        phc, capabilities = read_ethtool(interface)
+        Capabilities[interface] = capabilities
+        #Some drivers expose the PHC through ethtool only
+        device = get_devices().get(interface)
+        if device is not None and device["phc"] is None:
+            device["phc"] = phc
+    return Capabilities[interface]
+
+def get_phc_index(interface):
+    """Function returning PHC index of the interface, None if it has no PHC."""
+    device = get_devices().get(interface)
+    if device is None:
+        return None
+    if device["phc"] is None:
+        get_capabilities(interface)
+    return device["phc"]
+
+def get_phc_groups(interfaces=None):
+    """Function grouping interfaces by the PHC they share."""
+    groups = {}
+    for interface in interfaces if interfaces is not None else get_interfaces():
+        phc = get_phc_index(interface)
+        if phc is not None:
+            groups.setdefault(phc, []).append(interface)
+    return groups
+
+def get_shared_ports(interfaces):
+    """Function returning interfaces sharing a PHC with another or the same of the interfaces."""
+    conflicts = []
+    for members in get_phc_groups(interfaces).values():
+        #An interface given twice drives its PHC from two islands as well
+        if len(members) > 1:
+            conflicts.extend(dict.fromkeys(members))
+    return conflicts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PTP device inventory")
+    parser.add_argument("--ptp", action="store_true", help="Show only interfaces with a PHC")
+
+    args = parser.parse_args()
+    for name in get_interfaces():
+        phc_index = get_phc_index(name)
+        if args.ptp and phc_index is None:
+            continue
+        phc_name = f"/dev/ptp{phc_index}" if phc_index is not None else "-"
+        print(f"{name:16} PHC: {phc_name:12} Driver: {Devices[name]['driver'] or '-':12} "
+              f"Timestamping: {' '.join(get_capabilities(name)) or '-'}")
+    for phc_index, members in sorted(get_phc_groups().items()):
+        if len(members) > 1:
+            print(f"/dev/ptp{phc_index} is shared by {', '.join(members)}")
@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module providing island model GA running sub-populations in parallel processes."""
+
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import numpy
+import configureme as config
+import evaluate
+import metrics
+from artifacts import ArtifactStore
+from pareto import pareto_order
+from population import Population
+from population import ORIGIN_MIGRANT
+from population import next_generation
+from population import generation_size
+
+def select_order(population):
+    """Function ordering creatures from the best one."""
+    if config.multi_objective is True:
+        return pareto_order(population.objectives)
+    return numpy.argsort(population.rating)
+
+def receive_migrants(inbox):
+    """Function returning the latest migrants sent to the island, if any."""
+    migrants = []
+    while True:
+        try:
+            migrants = inbox.get_nowait()
+        except queue.Empty:
+            return migrants
+
+def run_island(index, evaluator, duration, result_path, inbox, outbox, results):
+    """Function evolving a single island bound to its own evaluator."""
+    #Forked islands would otherwise draw identical random creatures
+    numpy.random.seed()
+    random.seed()
+    #Metrics inherited from the parent are already published there
+    metrics.drain()
+
+    island_path = os.path.abspath(f"{result_path}/island{index}")
+    os.makedirs(island_path, exist_ok=True)
+    evaluate.Work_path = f"{island_path}/work"
+    stabilityfilename = f"{island_path}/{config.app}_stability.log"
+    store = ArtifactStore(island_path)
+
+    if evaluator == "simulator":
+        config.backend = "simulator"
+        interface = None
+    else:
+        config.backend = "hardware"
+        interface = evaluator
+
+    population = Population.random(config.gen_population_size)
+    best = None
+    for epoch in range(config.gen_epochs):
+        population.genes = numpy.round(population.genes, 3)
+        for i, creature in enumerate(population):
+            print(f"Island {index} epoch {epoch}: creature {i}, k_p {creature.k_p:.3f},"\
+                  f" k_i {creature.k_i:.3f} ", end="", flush=True)
+            creature.evaluate_data(interface, duration, best[2] if best else None)
+            creature.commit_artifacts(store)
+            results.put(("creature", index, epoch, i, creature.k_p, creature.k_i,
+                         creature.rating, creature.failure))
+            #Metrics of the evaluator are published by the parent
+            results.put(("metrics", metrics.drain()))
+
+        order = select_order(population)
+        top = order[0]
+        if best is None or population.rating[top] < best[2]:
+            best = (float(population.k_p[top]), float(population.k_i[top]),
+                    float(population.rating[top]))
+        results.put(("elite", index, epoch) + best)
+
+        new_generation = next_generation(population, order, stabilityfilename)
+        if (epoch + 1) % config.island_migration_interval == 0:
+            emigrants = order[:config.gen_elite_size]
+            outbox.put(population.genes[emigrants].tolist())
+
+        #Migrants replace the random creatures at the end of the new generation
+        migrants = receive_migrants(inbox)[:len(new_generation)]
+        if migrants:
+            new_generation.genes[-len(migrants):] = migrants
+            new_generation.origin[-len(migrants):] = ORIGIN_MIGRANT
+        population = new_generation
+
+    shutil.rmtree(evaluate.Work_path, ignore_errors=True)
+    results.put(("done", index))
+
+def run_islands(evaluators, duration, csvfilename, elitefilename, result_path,
+                failuresfilename=None):
+    """Function running islands and collecting their results, returns the best creature."""
+    inboxes = [multiprocessing.Queue() for _ in evaluators]
+    results = multiprocessing.Queue()
+    processes = []
+    for index, evaluator in enumerate(evaluators):
+        #Islands exchange elite creatures in a ring
+        process = multiprocessing.Process(target=run_island,
+                                          args=(index, evaluator, duration, result_path,
+                                                inboxes[index],
+                                                inboxes[(index + 1) % len(evaluators)],
+                                                results))
+        process.start()
+        processes.append(process)
+
+    stride = max(config.gen_population_size, generation_size())
+    best = None
+    running = len(processes)
+    while running:
+        try:
+            message = results.get(timeout=60)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                print("Islands stopped without reporting results")
+                break
+            continue
+        if message[0] == "creature":
+            _, index, epoch, i, k_p, k_i, rating, failure = message
+            with open(csvfilename, "a", encoding="utf-8") as csvfile:
+                csvfile.write(f"{epoch},{index * stride + i},"\
+                              f"{k_p},{k_i},{rating}\n")
+            if failure is not None and failuresfilename:
+                with open(failuresfilename, "a", encoding="utf-8") as failuresfile:
+                    failuresfile.write(f"{epoch},{index * stride + i},{k_p},{k_i},"
+                                       f"{failure},{rating}\n")
+        elif message[0] == "metrics":
+            metrics.merge(message[1])
+        elif message[0] == "elite":
+            _, index, epoch, k_p, k_i, rating = message
+            with open(elitefilename, "a", encoding="utf-8") as elitefile:
+                elitefile.write(f"{epoch},{k_p},{k_i},{rating}\n")
+            print(f"Island {index} epoch {epoch}: Best score: {rating}")
+            if best is None or rating < best[3]:
+                best = (index, k_p, k_i, rating)
+            metrics.set_gauge("epoch_best_rating", rating, epoch=epoch, island=index)
+            metrics.set_gauge("best_rating", best[3])
+        elif message[0] == "done":
+            running = running - 1
+
+    for process in processes:
+        process.join()
+    return best
@@ -10,17 +10,46 @@
 """Module providing GA for PTP PI controller."""
 
 import sys
-import random
 import os
 import shutil
 import argparse
 import time
+import json
 import numpy
 import configureme as config
+import evaluate
+import metrics
 from evaluate import Creature
+from population import Population
+from population import next_generation
+from population import ORIGIN_WARM_START
+from population import ORIGIN_SURVEY
+from population import random_params
+from cascade import add_cascade_params
+from cascade import repair_gains
+from cmaes import CMAES
 from create_graph import graph_elite
 from create_graph import graph_all
 from create_graph import create_scatter_plot
+from create_graph import create_params_plot
+from pareto import pareto_order
+from pareto import pareto_front
+from distributed import Coordinator
+from artifacts import ArtifactStore
+from island import run_islands
+from inventory import get_interfaces
+from inventory import get_shared_ports
+from system_noise import NOISE_FIELDS
+from scheduling import SCHEDULING_FIELDS
+from scheduling import check_low_jitter
+from scheduling import pin_orchestrator
+from racing import race
+from racing import get_samples
+from run_index import open_index
+from run_index import update_index
+from run_index import query_warm_start
+from stability import redefine_to_stable_array
+from survey import load_survey
 
 class Range():
     """Class providing range"""
@@ -34,82 +63,17 @@ class Range():
     def __iter__(self):
         yield self
 
-def validate_stability(p_term, i_term):
-    """Function validating stability."""
-    if config.stability_verification == "Complex":
-        eq1 = (((p_term + i_term)*(p_term + i_term)) < (4*i_term))
-        eq2 = 0 <= i_term <= 4
-        eq3 = 0 <= p_term <= 1
-        if eq1 and eq2 and eq3:
-            return True
-        return False
-    if config.stability_verification == "Real":
-        eq1 = ((2*p_term) < (4 - i_term))
-        eq2 = 0 <= i_term <= 4
-        eq3 = 0 <= p_term <= 2
-        if eq1 and eq2 and eq3:
-            return True
-        return False
-    return True
-
-def draw_stable_kp_ki():
-    """Function drawing stable k_p and k_i pair."""
-    stable = False
-    if config.stability_verification == "Complex":
-        gen_max_kp_stable = config.gen_max_kp_stable_complex
-    else:
-        gen_max_kp_stable = config.gen_max_kp_stable_real
-    while not stable:
-        p_term = random.uniform(0, gen_max_kp_stable)
-        i_term = random.uniform(0, config.gen_max_ki_stable)
-        if validate_stability(p_term, i_term):
-            stable = True
-    return p_term, i_term
-
-def redefine_kp_ki_to_stable(p_term, i_term):
-    """Function redefining k_p and k_i to stable."""
-    if validate_stability(p_term, i_term):
-        return p_term,i_term
-    stable = False
-    if config.stability_verification == "Complex":
-        while not stable:
-            if config.debug_level != 1:
-                with open(stabilityfilename, "a", encoding="utf-8") as stabilityfile:
-                    stabilityfile.write(f"{i_term};{p_term}\n")
-            if i_term < 1:
-                i_term = i_term + (1 - i_term) * config.reduction_determinant
-            if i_term > 1:
-                i_term = i_term - (i_term - 1) * config.reduction_determinant
-            if i_term == 0:
-                i_term = i_term + config.reduction_determinant
-            if p_term == 0:
-                p_term = p_term + config.reduction_determinant
-            p_term = p_term - (p_term * config.reduction_determinant)
-            i_term = round(i_term, 3)
-            p_term = round(p_term, 3)
-            if validate_stability(p_term, i_term):
-                stable = True
-        return p_term,i_term
-    if config.stability_verification == "Real":
-        while not stable:
-            if config.debug_level != 1:
-                with open(stabilityfilename, "a", encoding="utf-8") as stabilityfile:
-                    stabilityfile.write(f"{i_term};{p_term}\n")
-            i_term = i_term - (i_term * config.reduction_determinant)
-            p_term = p_term - (p_term * config.reduction_determinant)
-            if i_term <= 0:
-                i_term = i_term + config.reduction_determinant
-            if p_term <= 0:
-                p_term = p_term + config.reduction_determinant
-            i_term = round(i_term, 3)
-            p_term = round(p_term, 3)
-            if validate_stability(p_term, i_term):
-                stable = True
-        return p_term,i_term
-    return p_term,i_term
-
-if config.metric not in {"MSE", "RMSE", "MAE"}:
-    print("Specify one of the following metrics: MSE, RMSE, MAE")
+if config.app not in {"ptp4l", "phc2sys", "cascade"}:
+    print("Specify one of the following apps: ptp4l, phc2sys, cascade")
+    sys.exit()
+if config.metric not in {"MSE", "RMSE", "MAE", "LOCK_TIME", "SETTLING_TIME", "OVERSHOOT",
+                         "MTIE", "TDEV"}:
+    print("Specify one of the following metrics: MSE, RMSE, MAE, "\
+          "LOCK_TIME, SETTLING_TIME, OVERSHOOT, MTIE, TDEV")
+    sys.exit()
+if config.metric in {"MTIE", "TDEV"} and config.timing_limits.get(config.metric) and \
+   len(config.timing_limits[config.metric]) != len(config.timing_windows):
+    print(f"Specify one {config.metric} limit per timing window")
     sys.exit()
 if config.stability_verification not in {"Complex", "Real", "False"}:
     print("Specify one of the following options for stability verification: Complex, Real, False")
@@ -144,30 +108,128 @@ if config.gen_elite_size < 0:
 if config.test_repeted_creatures not in {True, False}:
     print("Specify one of the following options for testing repeated creatures: True, False")
     sys.exit()
+if config.adaptive_duration not in {True, False}:
+    print("Specify one of the following options for adaptive duration: True, False")
+    sys.exit()
+if config.backend not in {"hardware", "simulator"}:
+    print("Specify one of the following backends: hardware, simulator")
+    sys.exit()
+if config.multi_objective not in {True, False}:
+    print("Specify one of the following options for multi-objective optimization: True, False")
+    sys.exit()
+#Cascaded mode tunes phc2sys gains together with the ptp4l ones
+if config.app == "cascade":
+    add_cascade_params()
+for servo_param, servo_bounds in config.gen_servo_params.items():
+    if len(servo_bounds) != 3 or servo_bounds[0] >= servo_bounds[1]:
+        print(f"Specify [min, max, integer] with min lower than max for {servo_param}")
+        sys.exit()
+if config.noise_instrumentation not in {True, False}:
+    print("Specify one of the following options for noise instrumentation: True, False")
+    sys.exit()
+if config.noise_max_retries < 0:
+    print("Number of noisy test retries must be greater or equal 0")
+    sys.exit()
+if config.low_jitter not in {True, False}:
+    print("Specify one of the following options for low jitter: True, False")
+    sys.exit()
+if set(config.failure_penalties) != set(evaluate.FAILURES):
+    print(f"Specify failure penalties of: {', '.join(evaluate.FAILURES)}")
+    sys.exit()
+if config.failure_max_retries < 0:
+    print("Number of failed test retries must be greater or equal 0")
+    sys.exit()
+if config.racing not in {True, False}:
+    print("Specify one of the following options for racing: True, False")
+    sys.exit()
+if config.racing is True and (config.racing_top_size < 1 or config.racing_max_evaluations < 2):
+    print("Racing needs top size of at least 1 and at least 2 evaluations")
+    sys.exit()
+if config.warm_start not in {True, False}:
+    print("Specify one of the following options for warm start: True, False")
+    sys.exit()
+if config.warm_start_size < 0:
+    print("Warm start size must be greater or equal 0")
+    sys.exit()
+if config.strategy not in {"ga", "cmaes"}:
+    print("Specify one of the following strategies: ga, cmaes")
+    sys.exit()
+if config.strategy == "cmaes" and not 0 < config.cmaes_sigma <= 1:
+    print("CMA-ES step size must be greater than 0 and lower or equal 1")
+    sys.exit()
+if config.metrics_port is not None and not 0 <= config.metrics_port <= 65535:
+    print("Metrics port must be between 0 and 65535")
+    sys.exit()
+if config.survey not in {True, False}:
+    print("Specify one of the following options for survey: True, False")
+    sys.exit()
+if config.survey is True and (config.survey_grid < 2 or config.survey_duration < 1):
+    print("Survey needs grid of at least 2 values and duration of at least 1 s")
+    sys.exit()
+if config.multi_objective is True and len(config.pareto_weights) != 3:
+    print("Specify pareto weights for metric, lock time and frequency noise")
+    sys.exit()
 
 
 #Validate interface
-adapterlist = os.listdir('/sys/class/net/')
+adapterlist = get_interfaces()
 parser = argparse.ArgumentParser(description='Genetic algorithm for PID in PTP implementation')
 
 #List of arguments
 parser.add_argument("--i", type=str, choices = adapterlist, help="Interface")
 parser.add_argument("--t", default=120, choices=range(1,9999), type=int,
                     help="-t from PTP script", metavar="[1-9999]")
+parser.add_argument("--distributed", action="store_true",
+                    help="Evaluate creatures on workers connected to the coordinator")
+parser.add_argument("--islands", type=str, nargs="+", choices=adapterlist + ["simulator"],
+                    help="Evaluators (interface or simulator) of the islands evolving in parallel")
 
 args = parser.parse_args()
+#Tests of the distributed run are pinned by the workers
+if config.low_jitter is True and not args.distributed:
+    if args.islands:
+        print("Low jitter mode pins one servo at a time, it cannot be used with islands")
+        sys.exit()
+    low_jitter_error = check_low_jitter()
+    if low_jitter_error:
+        print(low_jitter_error)
+        sys.exit()
+    pin_orchestrator()
+if config.metrics_port is not None:
+    metrics.start_server()
 
 #Pull date and time to use as log filename
 timestr = time.strftime("%Y%m%d-%H%M%S")
 result_path = f'./{config.app}_{timestr}'
 #Define filenames
 os.makedirs(result_path, exist_ok=True)
+#Tests run in workspaces under the result path and are moved into the store when done
+evaluate.Work_path = f'{result_path}/work'
 csvfilename = f'{result_path}/{config.app}.csv'
 logfilename = f'{result_path}/{config.app}.log'
 elitefilename = f'{result_path}/{config.app}_elite.csv'
 stabilityfilename = f'{result_path}/{config.app}_stability.log'
+objectivesfilename = f'{result_path}/{config.app}_objectives.csv'
+paretofilename = f'{result_path}/{config.app}_pareto.csv'
+durationfilename = f'{result_path}/{config.app}_duration.csv'
+settingsfilename = f'{result_path}/{config.app}_settings.json'
+paramsfilename = f'{result_path}/{config.app}_params.csv'
+noisefilename = f'{result_path}/{config.app}_noise.csv'
+racingfilename = f'{result_path}/{config.app}_racing.csv'
+schedulingfilename = f'{result_path}/{config.app}_scheduling.csv'
+failuresfilename = f'{result_path}/{config.app}_failures.csv'
+prunedfilename = f'{result_path}/{config.app}_pruned.csv'
 initialvaluesfilename = "initial_values.csv"
 
+#Store settings of the run used by run_index.py
+with open(settingsfilename, "w", encoding="utf-8") as settingsfile:
+    json.dump({"app": config.app, "metric": config.metric, "interface": args.i,
+               "duration": args.t, "backend": config.backend, "islands": args.islands,
+               "distributed": args.distributed,
+               "config": {name: value for name, value in vars(config).items()
+                          if not name.startswith("_")}},
+              settingsfile, indent=4, default=str)
+
 #Add header to csvfilename
 with open(csvfilename, "a", encoding="utf-8") as csvfile:
     csvfile.write("epoch,creature,k_p,k_i,rating\n")
@@ -176,11 +238,84 @@ with open(csvfilename, "a", encoding="utf-8") as csvfile:
 with open(elitefilename, "a", encoding="utf-8") as elitefile:
     elitefile.write("epoch,k_p,k_i,rating\n")
 
+#Add header to paramsfilename
+if config.gen_servo_params:
+    with open(paramsfilename, "a", encoding="utf-8") as paramsfile:
+        paramsfile.write(",".join(["epoch", "creature", "k_p", "k_i"] +
+                                  list(config.gen_servo_params) + ["rating"]) + "\n")
+
+#Add header to noisefilename
+if config.noise_instrumentation is True:
+    with open(noisefilename, "a", encoding="utf-8") as noisefile:
+        noisefile.write(",".join(("epoch", "creature", "k_p", "k_i", "rating") + NOISE_FIELDS)
+                        + "\n")
+
+#Add header to schedulingfilename
+if config.low_jitter is True:
+    with open(schedulingfilename, "a", encoding="utf-8") as schedulingfile:
+        schedulingfile.write(",".join(("epoch", "creature", "k_p", "k_i", "rating")
+                                      + SCHEDULING_FIELDS) + "\n")
+
+#Add header to failuresfilename
+with open(failuresfilename, "a", encoding="utf-8") as failuresfile:
+    failuresfile.write("epoch,creature,k_p,k_i,failure,rating\n")
+
+#Add header to prunedfilename
+if config.survey is True and config.survey_prune_factor is not None:
+    with open(prunedfilename, "a", encoding="utf-8") as prunedfile:
+        prunedfile.write("epoch,creature,k_p,k_i,predicted\n")
+
+#Add header to racingfilename
+if config.racing is True:
+    with open(racingfilename, "a", encoding="utf-8") as racingfile:
+        racingfile.write("epoch,k_p,k_i,evaluations,mean,std\n")
+
+#Add header to durationfilename
+if config.adaptive_duration is True:
+    with open(durationfilename, "a", encoding="utf-8") as durationfile:
+        durationfile.write("epoch,creature,k_p,k_i,duration,stop_reason\n")
+
+#Add header to objectivesfilename
+if config.multi_objective is True:
+    with open(objectivesfilename, "a", encoding="utf-8") as objectivesfile:
+        objectivesfile.write("epoch,creature,k_p,k_i,offset,lock_time,freq_noise\n")
+
+#Run island model instead of a single population
+if args.islands:
+    if config.strategy != "ga":
+        print("Island model supports only the ga strategy")
+        sys.exit()
+    if config.island_migration_interval < 1:
+        print("Min migration interval: 1")
+        sys.exit()
+    #Ports sharing a clock cannot be tuned at the same time
+    shared_ports = get_shared_ports([island for island in args.islands if island != "simulator"])
+    if shared_ports:
+        print(f"Islands on {', '.join(shared_ports)} share a PTP hardware clock")
+        sys.exit()
+    print(f"Running {len(args.islands)} islands...")
+    island_best = run_islands(args.islands, args.t, csvfilename, elitefilename, result_path,
+                              failuresfilename)
+    with open(logfilename, "a", encoding="utf-8") as f:
+        f.write("\n***************************************************************\n")
+        f.write("Island model best result:\n")
+        if island_best:
+            f.write(f"Island: {island_best[0]}, k_p: {island_best[1]}, "
+                    f"k_i: {island_best[2]}, Score: {island_best[3]}\n")
+    graph_elite(elitefilename)
+    create_scatter_plot(csvfilename, f"{result_path}/scatter_plot.png", config.metric)
+    sys.exit(0)
+
 #Measure default settings
 print("Measuring result with default settings...")
+coordinator = Coordinator() if args.distributed else None
 default = Creature(0.7,0.3)
-default.evaluate_data(args.i, args.t)
-shutil.move(f"{config.app}_P0.7_I0.3", f"{result_path}/{config.app}_P0.7_I0.3")
+if coordinator:
+    coordinator.evaluate_creatures([default], args.t)
+else:
+    default.evaluate_data(args.i, args.t)
+store = ArtifactStore(result_path)
+default.commit_artifacts(store)
 print(f"Default k_p: {default.k_p} default k_i: {default.k_i} Score: {default.rating}\n")
 
 with open(logfilename, "a", encoding="utf-8") as f:
@@ -193,8 +328,11 @@ if config.stability_verification is True:
 
 #Initial population
 population_size = config.gen_population_size
-population = []
+initial_kp = []
+initial_ki = []
+initial_params = []
 elite = []
+archive = []
 count = 0
 
 print("Creating initial population...")
@@ -211,69 +349,171 @@ if config.initial_values is True:
 
         for line in lines:
             parts = line.strip().split(',')
-            if len(parts) == 2:
+            #Servo parameters not provided in the line are drawn randomly
+            if len(parts) in {2, 2 + len(config.gen_servo_params)}:
                 try:
                     k_p = float(parts[0])
                     k_i = float(parts[1])
-                    population.append(Creature(k_p, k_i))
+                    params = [float(part) for part in parts[2:]] or \
+                        random_params(1)[0].tolist()
+                    initial_kp.append(k_p)
+                    initial_ki.append(k_i)
+                    initial_params.append(params)
                     count = count + 1
                 except ValueError:
                     print(f"Skipping invalid line: {line}")
 
+#Initial values outside of the stability region are repaired as any other creature
+initial_kp, initial_ki = redefine_to_stable_array(initial_kp, initial_ki, stabilityfilename)
+initial_params = repair_gains(numpy.array(initial_params, dtype=float)
+                              .reshape(count, len(config.gen_servo_params)), stabilityfilename)
 population_size = population_size - count
 
-for _ in range(population_size):
-    if config.stability_verification in {"Real", "Complex"}:
-        k_p,k_i = draw_stable_kp_ki()
-        population.append(Creature(k_p,k_i))
-    else:
-        population.append(Creature(random.uniform(0, config.gen_max_kp),
-                                   random.uniform(0, config.gen_max_ki))) #nosec
+#Seed with the best creatures of previous runs
+warm_kp, warm_ki = [], []
+if config.warm_start is True:
+    index = open_index("run_index.sqlite")
+    update_index(index, ".")
+    warm_kp, warm_ki = query_warm_start(index, min(config.warm_start_size, population_size),
+                                        config.warm_start_min_distance, stabilityfilename,
+                                        app=config.app, interface=args.i,
+                                        metric=config.metric, backend=config.backend)
+    index.close()
+    print(f"Warm start: {len(warm_kp)} creatures taken from previous runs")
+population_size = population_size - len(warm_kp)
+
+#Seed with the best points of the response surface
+survey_kp, survey_ki = [], []
+surface = None
+if config.survey is True:
+    surface = load_survey(args.i, config.survey_duration)
+    if surface is not None:
+        surface.plot(f"{result_path}/survey_plot.png")
+        survey_kp, survey_ki = surface.best(min(config.survey_seed_size, population_size))
+        print(f"Survey: {len(survey_kp)} creatures taken from the response surface")
+population_size = population_size - len(survey_kp)
+
+population = Population.concatenate((Population(initial_kp, initial_ki,
+                                                params=initial_params),
+                                     Population(warm_kp, warm_ki, ORIGIN_WARM_START),
+                                     Population(survey_kp, survey_ki, ORIGIN_SURVEY),
+                                     Population.random(population_size)))
 
-cntr = 0
 print("Initial population created!")
+strategy = CMAES() if config.strategy == "cmaes" else None
 
 if config.debug_level != 1:
-    for creature in population:
-        print(f'Creature {cntr} k_p: {creature.k_p} k_i: {creature.k_i}')
-        cntr = cntr + 1
+    population.describe("Creature")
 
 for epoch in range(config.gen_epochs):
     print("***************************************************************")
     print(f"EPOCH NUMBER {epoch}")
     print("***************************************************************")
 
-    score = []
     sorted_scores_indexes = []
 
     #Evaluate candidates
+    population.genes = numpy.round(population.genes, 3)
+    creatures = list(population)
+
+    #Candidates predicted far worse than the elite are not tested
+    pruned = set()
+    if surface is not None and config.survey_prune_factor is not None and elite and \
+       config.multi_objective is not True:
+        predicted = surface.predict(population.k_p, population.k_i)
+        pruned = set(numpy.flatnonzero(predicted > config.survey_prune_factor *
+                                       elite[0].rating).tolist())
+        for index in pruned:
+            creatures[index].rating = round(float(predicted[index]), 3)
+            creatures[index].duration = 0
+            creatures[index].stop_reason = "pruned"
+
+    if coordinator:
+        coordinator.evaluate_creatures([parent for index, parent in enumerate(creatures)
+                                        if index not in pruned],
+                                       args.t, elite[0].rating if elite else None)
     i = 0
-    for parent in population:
-        new_k_p = round(parent.k_p,3)
-        new_k_i = round(parent.k_i,3)
-        parent.mutate(new_k_p, new_k_i)
-        print(f'Epoch {epoch}: creature {i}, k_p {new_k_p:.3f},'\
-              f' k_i {new_k_i:.3f} ', end="", flush=True)
-        parent.evaluate_data(args.i, args.t)
+    for parent in creatures:
+        print(f'Epoch {epoch}: creature {i}, k_p {parent.k_p:.3f},'\
+              f' k_i {parent.k_i:.3f} ', end="", flush=True)
+        if i in pruned:
+            print(f"Pruned, predicted score: {parent.rating}")
+        elif coordinator:
+            print(f"Score: {parent.rating}")
+        else:
+            parent.evaluate_data(args.i, args.t, elite[0].rating if elite else None)
         if config.test_repeted_creatures is False:
-            if os.path.isdir(f"{config.app}_P{parent.k_p}_I{parent.k_i}"):
-                shutil.move(f"{config.app}_P{parent.k_p}_I{parent.k_i}",
-                            f"{result_path}/{config.app}_P{parent.k_p}_I{parent.k_i}")
+            parent.commit_artifacts(store)
         else:
-            if os.path.isdir(f"{config.app}_P{parent.k_p}_I{parent.k_i}"):
-                shutil.move(f"{config.app}_P{parent.k_p}_I{parent.k_i}",
-                            f"{result_path}/{config.app}_P{parent.k_p}_I{parent.k_i}_Epoch{epoch}_Creature{i}")
+            parent.commit_artifacts(store, f"{parent.get_name()}_Epoch{epoch}_Creature{i}")
 
-        score.append(parent.rating)
-        with open(csvfilename, "a", encoding="utf-8") as csvfile:
-            csvfile.write(f"{epoch},{i},{parent.k_p},{parent.k_i},{parent.rating}\n")
+        #Predictions are kept out of the results indexed as measurements
+        if i in pruned:
+            with open(prunedfilename, "a", encoding="utf-8") as prunedfile:
+                prunedfile.write(f"{epoch},{i},{parent.k_p},{parent.k_i},{parent.rating}\n")
+        else:
+            with open(csvfilename, "a", encoding="utf-8") as csvfile:
+                csvfile.write(f"{epoch},{i},{parent.k_p},{parent.k_i},{parent.rating}\n")
+        if config.gen_servo_params:
+            params = ",".join(str(value) for value in parent.params.values())
+            with open(paramsfilename, "a", encoding="utf-8") as paramsfile:
+                paramsfile.write(f"{epoch},{i},{parent.k_p},{parent.k_i},{params},"
+                                 f"{parent.rating}\n")
+        if config.noise_instrumentation is True and parent.noise:
+            noise = ",".join(str(parent.noise[field]) for field in NOISE_FIELDS)
+            with open(noisefilename, "a", encoding="utf-8") as noisefile:
+                noisefile.write(f"{epoch},{i},{parent.k_p},{parent.k_i},{parent.rating},"
+                                f"{noise}\n")
+        if config.low_jitter is True and parent.scheduling:
+            scheduling = ",".join(str(parent.scheduling[field]) for field in SCHEDULING_FIELDS)
+            with open(schedulingfilename, "a", encoding="utf-8") as schedulingfile:
+                schedulingfile.write(f"{epoch},{i},{parent.k_p},{parent.k_i},{parent.rating},"
+                                     f"{scheduling}\n")
+        if parent.failure is not None:
+            with open(failuresfilename, "a", encoding="utf-8") as failuresfile:
+                failuresfile.write(f"{epoch},{i},{parent.k_p},{parent.k_i},{parent.failure},"
+                                   f"{parent.rating}\n")
+        if config.adaptive_duration is True:
+            with open(durationfilename, "a", encoding="utf-8") as durationfile:
+                durationfile.write(f"{epoch},{i},{parent.k_p},{parent.k_i},"
+                                   f"{parent.duration},{parent.stop_reason}\n")
+        if config.multi_objective is True:
+            objectives = ",".join(str(objective) for objective in parent.objectives)
+            with open(objectivesfilename, "a", encoding="utf-8") as objectivesfile:
+                objectivesfile.write(f"{epoch},{i},{parent.k_p},{parent.k_i},{objectives}\n")
+            archive.append((epoch, parent.k_p, parent.k_i, parent.objectives))
         i = i + 1
 
+    #Measure contenders for the top ranks again
+    if config.racing is True:
+        def measure_again(contenders):
+            """Function measuring the contenders once more."""
+            if coordinator:
+                coordinator.evaluate_creatures(contenders, args.t, repeat=True)
+            for contender in contenders:
+                if not coordinator:
+                    print(f'Epoch {epoch}: racing k_p {contender.k_p:.3f},'\
+                          f' k_i {contender.k_i:.3f} ', end="", flush=True)
+                    contender.evaluate_data(args.i, args.t, repeat=True)
+                contender.commit_artifacts(store, f"{contender.get_name()}_Epoch{epoch}"
+                                           f"_Repeat{len(get_samples(contender))}")
+
+        with open(racingfilename, "a", encoding="utf-8") as racingfile:
+            for key, evaluations, mean, std in race(creatures, measure_again,
+                                                    config.racing_top_size):
+                if evaluations > 1:
+                    racingfile.write(f"{epoch},{key[0]},{key[1]},{evaluations},{mean},{std}\n")
+
+    score = population.rating
+
     if config.debug_level == 2:
         print(f"Score:  {score}")
 
     #Select candidates fo new generation
-    sorted_scores_indexes = numpy.argsort(score)
+    if config.multi_objective is True:
+        sorted_scores_indexes = pareto_order(population.objectives)
+    else:
+        sorted_scores_indexes = numpy.argsort(score)
 
     #Pick the best result and save it to the file
     index = sorted_scores_indexes[0]
@@ -296,7 +536,10 @@ for epoch in range(config.gen_epochs):
     #Create Elite
     for i in range(config.gen_elite_size):
         index = sorted_scores_indexes[i]
-        elite.append(population[index])
+        elite.append(Creature(population[index].k_p, population[index].k_i,
+                              population[index].params))
+        elite[-1].rating = population[index].rating
+        elite[-1].objectives = population[index].objectives
     elite.sort(key = lambda Creature: Creature.rating)
 
     for i in range(len(elite)):
@@ -308,6 +551,9 @@ for epoch in range(config.gen_epochs):
         elitefile.write(f"{epoch},{elite[0].k_p},{elite[0].k_i},{elite[0].rating}\n")
 
     print(f"Epoch {epoch}: Best score: {elite[0].rating} default {default.rating}")
+    metrics.set_gauge("best_rating", elite[0].rating)
+    metrics.set_gauge("epoch_best_rating", population[sorted_scores_indexes[0]].rating,
+                      epoch=epoch)
     if elite[0].rating > default.rating:
         print(f"Result worse by {(elite[0].rating-default.rating)/default.rating:.1%}\n")
         with open(logfilename, "a", encoding="utf-8") as f:
@@ -318,108 +564,15 @@ for epoch in range(config.gen_epochs):
             f.write(f"Result better by {(default.rating-elite[0].rating)/default.rating:.1%}\n")
 
     #Create new generation
-    new_generation = []
-
-    #Crossing parents
-    print("Crossing parents...")
-    x = 0
-    for x in range(config.gen_num_inherited):
-        y = x + 1
-        for _ in range(config.gen_num_inherited - x - 1):
-            if config.debug_level == 2:
-                print(x, " + ", y)
-            if config.stability_verification:
-                if config.debug_level == 2:
-                    print("Veryfing parent stability")
-                if (validate_stability(population[sorted_scores_indexes[x]].k_p,
-                                       population[sorted_scores_indexes[y]].k_i)):
-                    new_generation.append(Creature(population[sorted_scores_indexes[x]].k_p,
-                                                   population[sorted_scores_indexes[y]].k_i))
-                else:
-                    k_p, k_i = redefine_kp_ki_to_stable(population[sorted_scores_indexes[x]].k_p,
-                                                      population[sorted_scores_indexes[y]].k_i)
-                    new_generation.append(Creature(k_p, k_i))
-                if (validate_stability(population[sorted_scores_indexes[y]].k_p,
-                                       population[sorted_scores_indexes[x]].k_i)):
-                    new_generation.append(Creature(population[sorted_scores_indexes[x]].k_p,
-                                                   population[sorted_scores_indexes[y]].k_i))
-                else:
-                    k_p, k_i = redefine_kp_ki_to_stable(population[sorted_scores_indexes[y]].k_p,
-                                                      population[sorted_scores_indexes[x]].k_i)
-                    new_generation.append(Creature(k_p, k_i))
-            else:
-                new_generation.append(Creature(population[sorted_scores_indexes[x]].k_p,
-                                               population[sorted_scores_indexes[y]].k_i))
-                new_generation.append(Creature(population[sorted_scores_indexes[y]].k_p,
-                                               population[sorted_scores_indexes[x]].k_i))
-            y = y + 1
-        x = x + 1
-    print("New generation creation - crossed creatures added!")
-    if config.debug_level != 1:
-        cntr = 0
-        for creature in new_generation:
-            print(f"New generation creature {cntr}, k_p: {creature.k_p}, k_i: {creature.k_i}")
-            cntr = cntr + 1
-
-    new_generation_size = len(new_generation)
-
-    #Replicating parents
-    print("Replicating parents...")
-    for x in range(config.gen_num_replicated):
-        new_generation.append(Creature(population[sorted_scores_indexes[x]].k_p,
-                                       population[sorted_scores_indexes[x]].k_i))
-    print("New generation creation - replicated creatures added!")
-    if config.debug_level != 1:
-        cntr2 = 0
-        for creature in new_generation:
-            if cntr2 < new_generation_size:
-                cntr2 = cntr2 + 1
-                continue
-            print(f'New generation creature {cntr2} k_p: {creature.k_p:.3f}'\
-                  f' k_i: {creature.k_i:.3f}')
-            cntr2 = cntr2 + 1
-    new_generation_size = len(new_generation)
-
-    #Adding randoms
-    print("Adding new random parents")
-    for _ in range(config.gen_num_random):
-        if config.stability_verification is True:
-            k_p,k_i = draw_stable_kp_ki()
-            new_generation.append(Creature(k_p,k_i))
-        else:
-            new_generation.append(Creature(random.uniform(0, config.gen_max_kp),
-                                           random.uniform(0, config.gen_max_ki))) #nosec
-
-    print("New generation creation - random creatures added!")
-    if config.debug_level != 1:
-        cntr2 = 0
-        for creature in new_generation:
-            if cntr2 < new_generation_size:
-                cntr2 = cntr2 + 1
-                continue
-            print(f'New generation creature {cntr2} k_p: {creature.k_p:.3f}'\
-                  f' k_i: {creature.k_i:.3f}')
-            cntr2 = cntr2 + 1
-
-    #Mutation
-    print("Mutants are coming...")
-    for creature in new_generation:
-        rand_x = random.uniform(-1, 1) #nosec
-        new_kp = creature.k_p + (rand_x * config.gen_mutation_coef)
-        new_kp = max(0, min(new_kp, config.gen_max_kp))
-        rand_y = random.uniform(-1, 1) #nosec
-        new_ki = creature.k_i + (rand_y * config.gen_mutation_coef)
-        new_ki = max(0, min(new_ki, config.gen_max_ki))
-        if not validate_stability(new_kp, new_ki):
-            new_kp, new_ki = redefine_kp_ki_to_stable(new_kp, new_ki)
-        creature.mutate(new_kp, new_ki)
-    print("Mutation finished!")
+    print("Creating new generation...")
+    if strategy:
+        strategy.tell(population, sorted_scores_indexes)
+        new_generation = strategy.ask(stabilityfilename)
+    else:
+        new_generation = next_generation(population, sorted_scores_indexes, stabilityfilename)
+    print("New generation created!")
     if config.debug_level != 1:
-        cntr = 0
-        for creature in new_generation:
-            print(f'New generation creature {cntr} k_p: {creature.k_p:.3f}'\
-                  f' k_i: {creature.k_i:.3f}')
-            cntr = cntr + 1
+        new_generation.describe("New generation creature")
 
     #Print information about progress
     number_of_creatures = len(new_generation)
@@ -427,20 +580,49 @@ for epoch in range(config.gen_epochs):
     epoch_progress = number_of_creatures * config.gen_epochs
     print("***************************************************************")
     print(f"Progress: {progress/epoch_progress:.1%}")
+    metrics.update_progress(epoch, epoch + 1, config.gen_epochs)
     print("***************************************************************")
 
     #Switching generations
     population = new_generation
 
+#All workspaces were committed to the store
+shutil.rmtree(evaluate.Work_path, ignore_errors=True)
+
 with open(logfilename, "a", encoding="utf-8") as f:
     f.write("\n***************************************************************\n")
     f.write("Genetic algorithm best results:\n")
     #os.chmod(logfilename, 0o600)
     for creature in elite:
-        f.write(f"k_p: {creature.k_p}, k_i: {creature.k_i}, Score: {creature.rating}\n")
+        params = "".join(f"{name}: {value}, " for name, value in creature.params.items())
+        f.write(f"k_p: {creature.k_p}, k_i: {creature.k_i}, {params}"
+                f"Score: {creature.rating}\n")
 
 if config.graph_per_epoch:
     graph_all(csvfilename)
 
+if config.multi_objective is True:
+    front = pareto_front([entry[3] for entry in archive])
+    with open(paretofilename, "a", encoding="utf-8") as paretofile:
+        paretofile.write("epoch,k_p,k_i,offset,lock_time,freq_noise\n")
+        for index in front:
+            front_epoch, k_p, k_i, objectives = archive[index]
+            objectives = ",".join(str(objective) for objective in objectives)
+            paretofile.write(f"{front_epoch},{k_p},{k_i},{objectives}\n")
+
 graph_elite(elitefilename)
-create_scatter_plot(csvfilename, f"{result_path}/scatter_plot.png", config.metric)
+if config.gen_servo_params:
+    create_params_plot(paramsfilename, f"{result_path}/params_plot.png", config.metric)
+if config.multi_objective is True:
+    operating_point = create_scatter_plot(csvfilename, f"{result_path}/scatter_plot.png",
+                                          config.metric, objectivesfilename,
+                                          config.pareto_weights)
+    with open(logfilename, "a", encoding="utf-8") as f:
+        f.write("\n***************************************************************\n")
+        f.write("Pareto front operating point:\n")
+        f.write(f"k_p: {operating_point['k_p']}, k_i: {operating_point['k_i']}, "
+                f"{config.metric}: {operating_point['offset']}, "
+                f"Lock time: {operating_point['lock_time']}, "
+                f"Freq noise: {operating_point['freq_noise']}\n")
+else:
+    create_scatter_plot(csvfilename, f"{result_path}/scatter_plot.png", config.metric)
@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module collecting optimizer metrics and serving them over HTTP in Prometheus or JSON format."""
+
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import configureme as config
+
+PREFIX = "ptp_optimization_"
+
+#Help text and type of every published metric
+METRICS = {"evaluations_total": ("Tests run by the evaluator", "counter"),
+           "cache_hits_total": ("Repeated creatures rated from the cache", "counter"),
+           "noisy_retries_total": ("Tests repeated because the host was noisy", "counter"),
+           "failed_retries_total": ("Failed tests repeated, by failure", "counter"),
+           "failures_total": ("Tests rated with the failure penalty, by failure", "counter"),
+           "evaluation_duration_seconds": ("Wall time of a creature evaluation", "histogram"),
+           "phase_duration_seconds": ("Wall time of the evaluation phases", "histogram"),
+           "epoch": ("Current epoch", "gauge"),
+           "progress": ("Share of the epochs of the run done", "gauge"),
+           "evaluations_per_hour": ("Evaluations per hour since the run started", "gauge"),
+           "eta_seconds": ("Estimated time until the run ends", "gauge"),
+           "best_rating": ("Best rating found so far", "gauge"),
+           "epoch_best_rating": ("Best rating of each epoch", "gauge")}
+
+#Values of the metrics keyed by name and sorted label pairs
+Counters = {}
+Gauges = {}
+Histograms = {}
+Lock = threading.Lock()
+Start_time = time.time()
+
+def get_key(name, labels):
+    """Function returning key of the metric with labels."""
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+def inc(name, value=1, **labels):
+    """Function increasing counter."""
+    key = get_key(name, labels)
+    with Lock:
+        Counters[key] = Counters.get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    """Function setting gauge."""
+    with Lock:
+        Gauges[get_key(name, labels)] = value
+
+def observe(name, value, **labels):
+    """Function adding observation to histogram."""
+    key = get_key(name, labels)
+    with Lock:
+        if key not in Histograms:
+            Histograms[key] = {"buckets": [0] * len(config.metrics_buckets), "sum": 0, "count": 0}
+        histogram = Histograms[key]
+        for index, bound in enumerate(config.metrics_buckets):
+            if value <= bound:
+                histogram["buckets"][index] = histogram["buckets"][index] + 1
+        histogram["sum"] = histogram["sum"] + value
+        histogram["count"] = histogram["count"] + 1
+
+def drain():
+    """Function returning counters and histograms collected since the last call, resets them."""
+    with Lock:
+        snapshot = (dict(Counters), {key: dict(histogram, buckets=list(histogram["buckets"]))
+                                     for key, histogram in Histograms.items()})
+        Counters.clear()
+        Histograms.clear()
+    return snapshot
+
+def merge(snapshot):
+    """Function adding counters and histograms drained in another process."""
+    counters, histograms = snapshot
+    with Lock:
+        for key, value in counters.items():
+            Counters[key] = Counters.get(key, 0) + value
+        for key, histogram in histograms.items():
+            if key not in Histograms:
+                Histograms[key] = {"buckets": [0] * len(config.metrics_buckets),
+                                   "sum": 0, "count": 0}
+            total = Histograms[key]
+            total["buckets"] = [first + second for first, second
+                                in zip(total["buckets"], histogram["buckets"])]
+            total["sum"] = total["sum"] + histogram["sum"]
+            total["count"] = total["count"] + histogram["count"]
+
+def get_counter(name, **labels):
+    """Function returning value of counter."""
+    with Lock:
+        return Counters.get(get_key(name, labels), 0)
+
+def format_labels(labels, extra=()):
+    """Function formatting labels in Prometheus format."""
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
+
+def render_prometheus():
+    """Function returning all metrics in Prometheus text format."""
+    lines = []
+    with Lock:
+        for name, (description, kind) in METRICS.items():
+            values = Counters if kind == "counter" else Gauges
+            if kind == "histogram":
+                values = Histograms
+            keys = sorted(key for key in values if key[0] == name)
+            if not keys:
+                continue
+            lines.append(f"# HELP {PREFIX}{name} {description}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            for key in keys:
+                if kind != "histogram":
+                    lines.append(f"{PREFIX}{name}{format_labels(key[1])} {values[key]}")
+                    continue
+                histogram = values[key]
+                for bound, count in zip(config.metrics_buckets, histogram["buckets"]):
+                    lines.append(f"{PREFIX}{name}_bucket"
+                                 f"{format_labels(key[1], [('le', bound)])} {count}")
+                lines.append(f"{PREFIX}{name}_bucket"
+                             f"{format_labels(key[1], [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{PREFIX}{name}_sum{format_labels(key[1])} {histogram['sum']}")
+                lines.append(f"{PREFIX}{name}_count{format_labels(key[1])} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+def render_json():
+    """Function returning all metrics as JSON."""
+    def entries(values):
+        return [dict(key[1], name=key[0], value=value) for key, value in sorted(values.items())]
+    with Lock:
+        data = {"host": socket.gethostname(), "app": config.app, "metric": config.metric,
+                "uptime": round(time.time() - Start_time, 3),
+                "counters": entries(Counters), "gauges": entries(Gauges),
+                "histograms": [dict(key[1], name=key[0], buckets=dict(zip(
+                    map(str, config.metrics_buckets), histogram["buckets"])),
+                                    sum=histogram["sum"], count=histogram["count"])
+                               for key, histogram in sorted(Histograms.items())]}
+    return json.dumps(data, indent=4)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Handler serving /metrics in Prometheus format and /metrics.json as JSON."""
+
+    def do_GET(self):
+        """Function answering GET request."""
+        # pylint: disable=invalid-name
+        if self.path in {"/", "/metrics"}:
+            body = render_prometheus()
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body = render_json()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        """Function silencing request logs."""
+        # pylint: disable=redefined-builtin
+
+def start_server(host=None, port=None):
+    """Function serving metrics in a background thread, returns the server."""
+    host = config.metrics_host if host is None else host
+    port = config.metrics_port if port is None else port
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as error:
+        print(f"Cannot serve metrics on {host}:{port}: {error}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+def update_progress(epoch, done, total):
+    """Function updating epoch, progress, throughput and ETA gauges."""
+    elapsed = time.time() - Start_time
+    set_gauge("epoch", epoch)
+    set_gauge("progress", round(done / total, 4) if total else 0)
+    if elapsed > 0:
+        set_gauge("evaluations_per_hour", round(get_counter("evaluations_total") * 3600
+                                                / elapsed, 3))
+    if done:
+        set_gauge("eta_seconds", round(elapsed / done * max(total - done, 0), 3))
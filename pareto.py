@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module providing NSGA-II style multi-objective ranking."""
+
+import numpy
+
+def dominates(first, second):
+    """Function checking if first objectives vector dominates the second one."""
+    first = numpy.asarray(first)
+    second = numpy.asarray(second)
+    return bool(numpy.all(first <= second) and numpy.any(first < second))
+
+def non_dominated_sort(objectives):
+    """Function sorting objectives vectors into Pareto fronts."""
+    objectives = numpy.asarray(objectives, dtype=float)
+    size = len(objectives)
+    dominated_by = [[] for _ in range(size)]
+    domination_count = numpy.zeros(size, dtype=int)
+    fronts = [[]]
+
+    for i in range(size):
+        for j in range(size):
+            if i == j:
+                continue
+            if dominates(objectives[i], objectives[j]):
+                dominated_by[i].append(j)
+            elif dominates(objectives[j], objectives[i]):
+                domination_count[i] = domination_count[i] + 1
+        if domination_count[i] == 0:
+            fronts[0].append(i)
+
+    while fronts[-1]:
+        next_front = []
+        for i in fronts[-1]:
+            for j in dominated_by[i]:
+                domination_count[j] = domination_count[j] - 1
+                if domination_count[j] == 0:
+                    next_front.append(j)
+        fronts.append(next_front)
+
+    return fronts[:-1]
+
+def crowding_distance(objectives, front):
+    """Function calculating crowding distance of the creatures in the front."""
+    objectives = numpy.asarray(objectives, dtype=float)
+    distance = dict.fromkeys(front, 0.0)
+    if len(front) < 3:
+        return dict.fromkeys(front, numpy.inf)
+
+    for column in range(objectives.shape[1]):
+        ordered = sorted(front, key=lambda index: objectives[index][column])
+        low = objectives[ordered[0]][column]
+        high = objectives[ordered[-1]][column]
+        distance[ordered[0]] = numpy.inf
+        distance[ordered[-1]] = numpy.inf
+        if high == low:
+            continue
+        for i in range(1, len(ordered) - 1):
+            distance[ordered[i]] = distance[ordered[i]] + \
+                (objectives[ordered[i + 1]][column] - objectives[ordered[i - 1]][column]) / \
+                (high - low)
+    return distance
+
+def pareto_order(objectives):
+    """Function ordering creatures by front rank and decreasing crowding distance."""
+    order = []
+    for front in non_dominated_sort(objectives):
+        distance = crowding_distance(objectives, front)
+        order.extend(sorted(front, key=lambda index: -distance[index]))
+    return numpy.array(order, dtype=int)
+
+def pareto_front(objectives):
+    """Function returning indexes of the non-dominated creatures."""
+    if len(objectives) == 0:
+        return []
+    return non_dominated_sort(objectives)[0]
+
+def pick_operating_point(objectives, weights=None):
+    """Function picking the front member with the lowest weighted normalized objectives."""
+    objectives = numpy.asarray(objectives, dtype=float)
+    front = pareto_front(objectives)
+    if weights is None:
+        weights = numpy.ones(objectives.shape[1])
+    weights = numpy.asarray(weights, dtype=float)
+
+    low = objectives[front].min(axis=0)
+    span = objectives[front].max(axis=0) - low
+    span[span == 0] = 1
+    scores = ((objectives[front] - low) / span * weights).sum(axis=1)
+    return front[int(numpy.argmin(scores))]
@@ -7,70 +7,28 @@
 #     https://spdx.org/licenses/GPL-2.0-or-later.html
 """Script for parsing and plotting linuxptp tools logs"""
 
-import re
 import argparse
 import os
 import sys
 import warnings
 import numpy as np
 from matplotlib import pyplot as plt
+import ingest
 
 
 def parse_ptp4l_out(line):
     """Parse ptp4l logs"""
-    # journalctl -u ptp4l.service
-    # pattern = r'^(.+)ptp4l\[[0-9]+\]: \[(.+)\] master offset\s+(-?[0-9]+)'\
-    #           r' s([0123]) freq\s+([+-]\d+) path delay\s+(-?\d+)$'
-    # standard ptp4l.log
-    pattern = r'^ptp4l\[(\d+).(\d+)\]: master offset\s+(-?[0-9]+) s([0123])'\
-              r' freq\s+([+-]\d+) path delay\s+(-?\d+)$'
-    # https://regexr.com/
-
-    # Regex search
-    res = re.search(pattern, line)
-    # if pattern was matched
-    if res:
-        kernel_sec    = int(float(res.group(1)))
-        kernel_nsec   = int(res.group(2)) * 1000000
-        master_offset = int(res.group(3))
-        state         = int(res.group(4))
-        freq          = int(res.group(5))
-        path_delay    = int(res.group(6))
-
-        row = [kernel_sec, kernel_nsec, state, master_offset, freq, path_delay]
-    else:
-        row = []
-
-    return row
+    # standard ptp4l.log:
+    # ptp4l[145810.411]: master offset        -24 s2 freq     -27 path delay       642
+    # journal, multi-port and summary lines are detected by ingest.parse_line
+    return ingest.parse_line(line)
 
 
 def parse_phc2sys_out(line):
     """Parse phc2sys logs"""
-    # journalctl -u ptp4l.service
-    # pattern = r'^(.+)ptp4l\[[0-9]+\]: \[(.+)\] master offset\s+(-?[0-9]+)'\
-    #           r's([012]) freq\s+([+-]\d+) path delay\s+(-?\d+)$'
     # standard phc2sys.log:
     # phc2sys[689991.253]: CLOCK_REALTIME phc offset        33 s2 freq   -5355 delay    603
-    pattern = r'^phc2sys\[(\d+).(\d+)\]:\s+(\S+)\s+(\S+) offset\s+(-?[0-9]+)'\
-              r' s([0123]) freq\s+([+-]\d+) delay\s+(-?\d+)'
-    # https://regexr.com/
-
-    # Regex search
-    res = re.search(pattern, line)
-    # if pattern was matched
-    if res:
-        kernel_sec    = int(float(res.group(1)))
-        kernel_nsec   = int(res.group(2)) * 1000000
-        master_offset = int(res.group(5))
-        state         = int(res.group(6))
-        freq          = int(res.group(7))
-        path_delay    = int(res.group(8))
-
-        row = [kernel_sec, kernel_nsec, state, master_offset, freq, path_delay]
-    else:
-        row = []
-
-    return row
+    return ingest.parse_line(line)
 
 
 def filter_stable(arr):
@@ -86,12 +44,14 @@ def filter_stable(arr):
     return arr[stable]
 
 
-def plot(result_array):
+def plot(result_array, filename="test.png"):
     """Plot logged data to a file"""
     warnings.filterwarnings('ignore')
-    figure, axes = plt.subplots(nrows=3, ncols=1)
-
     result_array = filter_stable(result_array)
+    if not len(result_array):
+        print("No locked samples to plot")
+        return
+    figure, axes = plt.subplots(nrows=3, ncols=1)
 
     #master_offset
     axes[0].set_title('Master offset')
@@ -120,7 +80,8 @@ def plot(result_array):
     #plt.show()
     figure.set_figheight(10)
     figure.set_figwidth(15)
-    plt.savefig("test.png")
+    plt.savefig(filename)
+    plt.close(figure)
 
     # the histogram of the data
     # https://matplotlib.org/stable/api/_as_gen/matplotlib.pyplot.hist.html
@@ -133,55 +94,58 @@ def plot(result_array):
     #plt.show()
 
 
-def parse_file(filename, normalize=0):
-    """Parse log file"""
-    # Using readlines()
-    with open(filename, 'r', encoding="utf-8") as file1:
-        lines = file1.readlines()
-
-    if lines:
-        if lines[0].startswith("phc2sys"):
-            file_type = 1
-        else:
-            file_type = 0
-    else:
-        #Handle the case where Lines is empty
-        print("The file is empty or Linex[0] does not exist")
-        sys.exit()
-
-    for line in lines:
-        if file_type:
-            vector = parse_phc2sys_out(line)
-        else:
-            vector = parse_ptp4l_out(line)
-
-        if vector:
-            try:
-                result
-            except NameError:
-                result = np.array(vector)
-            else:
-                result = np.vstack([result, vector])
-        else:
-            continue
-
-        # extract state
-        state = vector[2]
-        if state == 0:
-            try:
-                start_time
-            except NameError:
-                start_time = vector[0]
-            continue
-
-        if state == 1:
-            continue
-
-        if state in (2,3):
-            try:
-                start_delay
-            except NameError:
-                start_delay = vector[0] - start_time
+def parse_file(filename, normalize=0, convergence=None, threshold=100, port=None):
+    """Parse log file, filling convergence dict with servo convergence metrics"""
+    try:
+        ports = ingest.read_ports(filename)
+    except OSError as error:
+        print(f"Cannot read the file {filename}: {error}")
+        ports = {}
+    if not ports:
+        print(f"The file {filename} is empty or has no offset lines")
+    # the port with the most samples unless given
+    result = ingest.select_port(ports, port)
+    if not len(result):
+        # empty logs are rated by the caller as failed tests
+        if convergence is not None:
+            convergence.update(lock_index=None, lock_time=0, settling_time=0, overshoot=0)
+        return result
+
+    timestamps = result[:,0] + result[:,1] / 1000000000
+    state = result[:,2]
+    offset = result[:,3]
+    locked = np.flatnonzero((state == 2) | (state == 3))
+    lock_index = int(locked[0]) if len(locked) else None
+
+    # the servo starts with the first s0 sample before lock, if any
+    unlocked = np.flatnonzero(state[:lock_index] == 0)
+    start = int(unlocked[0]) if len(unlocked) else 0
+    start_time = result[start,0]
+    start_timestamp = timestamps[start]
+
+    if convergence is not None:
+        duration = timestamps[-1] - start_timestamp
+        settled_since = None
+        overshoot = 0
+        if lock_index is not None:
+            # time since |offset| stays below threshold
+            above = np.flatnonzero(np.abs(offset[locked]) >= threshold)
+            if not len(above):
+                settled_since = timestamps[lock_index]
+            elif above[-1] < len(locked) - 1:
+                settled_since = timestamps[locked[above[-1] + 1]]
+
+            # largest excursion after the offset crossed zero for the first time
+            crossed = np.flatnonzero(offset[locked] * offset[lock_index] <= 0)
+            if len(crossed):
+                overshoot = int(np.max(np.abs(offset[locked[crossed[0]:]])))
+
+        convergence["lock_index"] = lock_index
+        convergence["lock_time"] = round(float(timestamps[lock_index] - start_timestamp
+                                               if lock_index is not None else duration), 3)
+        convergence["settling_time"] = round(float(settled_since - start_timestamp
+                                                   if settled_since is not None else duration), 3)
+        convergence["overshoot"] = overshoot
 
     if normalize:
         result = result - [start_time, 0, 0, 0 ,0 ,0]
@@ -211,6 +175,12 @@ if __name__ == '__main__':
                         help='input file to parse', nargs='?', const=1, default='ptp4l.log')
     parser.add_argument('--ut', action='store_true')
     parser.add_argument('--plot', action='store_true')
+    parser.add_argument('--convergence', action='store_true',
+                        help='print lock time, settling time and overshoot')
+    parser.add_argument('--threshold', type=int, default=100,
+                        help='|offset| [ns] below which the servo is considered settled')
+    parser.add_argument('--port', help='port or clock of multi-port logs, e.g. eth0 or '
+                        'CLOCK_REALTIME, the one with the most samples by default')
     args = parser.parse_args()
 
     if args.ut:
@@ -221,7 +191,15 @@ if __name__ == '__main__':
         print(f'File {format(args.input)} does not exist!', file=sys.stderr)
         sys.exit(-1)
 
-    array = parse_file(args.input, 1)
+    stats = {}
+    array = parse_file(args.input, 1, stats, args.threshold, args.port)
+    if not len(array):
+        sys.exit(-1)
+
+    if args.convergence:
+        print(f"Lock time: {stats['lock_time']} s")
+        print(f"Settling time: {stats['settling_time']} s")
+        print(f"Overshoot: {stats['overshoot']} ns")
 
     if args.plot:
         plot(array)
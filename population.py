@@ -0,0 +1,242 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module providing array-backed population and vectorized GA operators."""
+
+import numpy
+import configureme as config
+from evaluate import Creature
+from cascade import repair_gains
+from stability import draw_stable_array
+from stability import redefine_to_stable_array
+
+ORIGIN_INITIAL = 0
+ORIGIN_CROSSED = 1
+ORIGIN_REPLICATED = 2
+ORIGIN_RANDOM = 3
+ORIGIN_MIGRANT = 4
+ORIGIN_WARM_START = 5
+ORIGIN_SAMPLED = 6
+ORIGIN_SURVEY = 7
+ORIGIN_NAMES = ("initial", "crossed", "replicated", "random", "migrant", "warm start",
+                "sampled", "survey")
+NUM_OBJECTIVES = 3
+
+def get_param_bounds():
+    """Function returning lower and upper bounds of the servo parameters."""
+    bounds = numpy.array([config.gen_servo_params[name][:2] for name in config.gen_servo_params],
+                         dtype=float).reshape(-1, 2)
+    return bounds[:,0], bounds[:,1]
+
+def round_params(params):
+    """Function rounding integer servo parameters in place."""
+    integer = [bool(config.gen_servo_params[name][2]) for name in config.gen_servo_params]
+    params[:,integer] = numpy.round(params[:,integer])
+    return params
+
+def random_params(size):
+    """Function drawing servo parameters uniformly within their bounds."""
+    low, high = get_param_bounds()
+    return repair_gains(round_params(numpy.random.uniform(low, high, (size, len(low)))))
+
+class Population():
+    """Population stored as arrays of genes, ratings and metadata."""
+
+    def __init__(self, k_p=(), k_i=(), origin=ORIGIN_INITIAL, params=None):
+        """Init function."""
+        k_p = numpy.asarray(k_p, dtype=float)
+        if params is None:
+            params = random_params(len(k_p))
+        #Genes are k_p, k_i and the servo parameters in gen_servo_params order
+        self.genes = numpy.column_stack((k_p, numpy.asarray(k_i, dtype=float),
+                                         numpy.asarray(params, dtype=float)
+                                         .reshape(len(k_p), len(config.gen_servo_params))))
+        size = len(self.genes)
+        self.rating = numpy.zeros(size)
+        self.objectives = numpy.full((size, NUM_OBJECTIVES), numpy.nan)
+        self.origin = numpy.full(size, origin, dtype=numpy.int8)
+
+    @property
+    def k_p(self):
+        """k_p of all creatures."""
+        return self.genes[:,0]
+
+    @property
+    def k_i(self):
+        """k_i of all creatures."""
+        return self.genes[:,1]
+
+    @property
+    def params(self):
+        """Servo parameters of all creatures."""
+        return self.genes[:,2:]
+
+    def __len__(self):
+        return len(self.genes)
+
+    def __getitem__(self, index):
+        return CreatureView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield CreatureView(self, index)
+
+    def take(self, indexes, origin=None):
+        """Function returning population of the creatures with provided indexes."""
+        indexes = numpy.asarray(indexes, dtype=int)
+        subset = Population(self.k_p[indexes], self.k_i[indexes], params=self.params[indexes])
+        subset.rating = self.rating[indexes].copy()
+        subset.objectives = self.objectives[indexes].copy()
+        subset.origin = self.origin[indexes].copy()
+        if origin is not None:
+            subset.origin[:] = origin
+        return subset
+
+    def describe(self, label, start=0):
+        """Function printing creatures starting from the provided index."""
+        print("\n".join(f"{label} {index} k_p: {self.k_p[index]:.3f} "
+                        f"k_i: {self.k_i[index]:.3f} "
+                        + "".join(f"{name}: {value} " for name, value in self[index].params.items())
+                        + f"({ORIGIN_NAMES[self.origin[index]]})"
+                        for index in range(start, len(self))))
+
+    @classmethod
+    def concatenate(cls, populations):
+        """Function joining populations."""
+        joined = cls()
+        joined.genes = numpy.concatenate([population.genes for population in populations])
+        joined.rating = numpy.concatenate([population.rating for population in populations])
+        joined.objectives = numpy.concatenate([population.objectives
+                                               for population in populations])
+        joined.origin = numpy.concatenate([population.origin for population in populations])
+        return joined
+
+    @classmethod
+    def random(cls, size):
+        """Function drawing population of random creatures."""
+        if config.stability_verification in {"Real", "Complex"}:
+            k_p, k_i = draw_stable_array(size)
+        else:
+            k_p = numpy.random.uniform(0, config.gen_max_kp, size)
+            k_i = numpy.random.uniform(0, config.gen_max_ki, size)
+        return cls(k_p, k_i, ORIGIN_RANDOM)
+
+class CreatureView(Creature):
+    """Creature reading and writing its data from the population arrays."""
+
+    def __init__(self, population, index):
+        """Init function."""
+        # pylint: disable=super-init-not-called
+        self.population = population
+        self.index = index
+        #Genes, rating and objectives live in the arrays, the rest as in Creature
+        self.convergence = {}
+        self.duration = 0
+        self.stop_reason = ""
+        self.noise = {}
+        self.scheduling = {}
+        self.failure = None
+        self.workspace = None
+
+    @property
+    def k_p(self):
+        """k_p of the creature."""
+        return float(self.population.genes[self.index, 0])
+
+    @k_p.setter
+    def k_p(self, value):
+        self.population.genes[self.index, 0] = value
+
+    @property
+    def k_i(self):
+        """k_i of the creature."""
+        return float(self.population.genes[self.index, 1])
+
+    @k_i.setter
+    def k_i(self, value):
+        self.population.genes[self.index, 1] = value
+
+    @property
+    def rating(self):
+        """Rating of the creature."""
+        return float(self.population.rating[self.index])
+
+    @rating.setter
+    def rating(self, value):
+        self.population.rating[self.index] = value
+
+    @property
+    def objectives(self):
+        """Objectives of the creature, empty if not rated."""
+        objectives = self.population.objectives[self.index]
+        if numpy.isnan(objectives).all():
+            return []
+        return objectives.tolist()
+
+    @objectives.setter
+    def objectives(self, value):
+        if len(value) > 0:
+            self.population.objectives[self.index] = value
+
+    @property
+    def params(self):
+        """Servo parameters of the creature."""
+        return {name: int(value) if config.gen_servo_params[name][2] else float(value)
+                for name, value in zip(config.gen_servo_params,
+                                       self.population.genes[self.index, 2:])}
+
+    @params.setter
+    def params(self, value):
+        self.population.genes[self.index, 2:] = [value[name] for name in config.gen_servo_params]
+
+def crossover(parents):
+    """Function crossing each pair of parents in both directions."""
+    first, second = numpy.triu_indices(len(parents), 1)
+    #Genes alternate between the parents, k_p from one and k_i from the other
+    from_first = numpy.arange(parents.genes.shape[1]) % 2 == 0
+    child = numpy.where(from_first, parents.genes[first], parents.genes[second])
+    sibling = numpy.where(from_first, parents.genes[second], parents.genes[first])
+    #Children of a pair are kept next to each other
+    genes = numpy.stack((child, sibling), axis=1).reshape(-1, parents.genes.shape[1])
+    return Population(genes[:,0], genes[:,1], ORIGIN_CROSSED, genes[:,2:])
+
+def mutate(population, stability_log=None):
+    """Function mutating all creatures and repairing unstable ones."""
+    shift = numpy.random.uniform(-1, 1, population.genes.shape) * config.gen_mutation_coef
+    k_p = numpy.clip(population.k_p + shift[:,0], 0, config.gen_max_kp)
+    k_i = numpy.clip(population.k_i + shift[:,1], 0, config.gen_max_ki)
+    k_p, k_i = redefine_to_stable_array(k_p, k_i, stability_log)
+    population.genes[:,0] = k_p
+    population.genes[:,1] = k_i
+
+    #Servo parameters are mutated relative to their range
+    low, high = get_param_bounds()
+    params = population.params + shift[:,2:] * (high - low) * config.gen_param_mutation_range
+    population.genes[:,2:] = repair_gains(round_params(numpy.clip(params, low, high)),
+                                          stability_log)
+
+def generation_size():
+    """Function returning number of creatures in each new generation."""
+    return config.gen_num_inherited * (config.gen_num_inherited - 1) + \
+        config.gen_num_replicated + config.gen_num_random
+
+def next_generation(population, order, stability_log=None):
+    """Function creating new generation from the population ordered by ranking."""
+    crossed = crossover(population.take(order[:config.gen_num_inherited]))
+    crossed.genes[:,0], crossed.genes[:,1] = redefine_to_stable_array(crossed.k_p, crossed.k_i,
+                                                                      stability_log)
+    replicated = population.take(order[:config.gen_num_replicated], ORIGIN_REPLICATED)
+    random_creatures = Population.random(config.gen_num_random)
+    if config.debug_level != 1:
+        crossed.describe("Crossed creature")
+        replicated.describe("Replicated creature")
+        random_creatures.describe("Random creature")
+
+    new_generation = Population.concatenate((crossed, replicated, random_creatures))
+    new_generation.rating[:] = 0
+    new_generation.objectives[:] = numpy.nan
+    mutate(new_generation, stability_log)
+    return new_generation
@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module racing noisy creatures for the top ranks with repeated evaluations."""
+
+import numpy
+import configureme as config
+import evaluate
+
+#Measured ratings of each gene vector
+Samples = {}
+
+def get_key(creature):
+    """Function returning the gene vector of the creature."""
+    return (creature.k_p, creature.k_i) + tuple(creature.params.values())
+
+def get_samples(creature):
+    """Function returning ratings measured for the creature so far."""
+    return Samples.get(get_key(creature), [])
+
+def get_statistics(keys):
+    """Function returning mean and standard error of the ratings of each key."""
+    means = numpy.array([numpy.mean(Samples[key]) for key in keys])
+    counts = numpy.array([len(Samples[key]) for key in keys])
+    deviations = numpy.array([numpy.std(Samples[key], ddof=1) if len(Samples[key]) > 1
+                              else numpy.nan for key in keys])
+    #Keys measured once borrow the pooled deviation of the repeated ones
+    repeated = counts > 1
+    pooled = 0
+    if repeated.any():
+        pooled = numpy.sqrt(numpy.sum((counts[repeated] - 1) * deviations[repeated] ** 2) /
+                            numpy.sum(counts[repeated] - 1))
+    deviations = numpy.where(repeated, deviations, pooled)
+    return means, deviations / numpy.sqrt(counts), deviations
+
+def update_cache(key, rating):
+    """Function replacing the cached rating of the key with the aggregated one."""
+    for index, creature in enumerate(evaluate.Checked_data):
+        #Gains failed by the host are not cached
+        if get_key(creature) == key and evaluate.is_cached(index):
+            evaluate.Rating_table[index] = rating
+
+def race(creatures, measure, top_size):
+    """Function re-evaluating contenders for the top ranks, returns summary per raced key."""
+    groups = {}
+    failed = {}
+    for creature in creatures:
+        groups.setdefault(get_key(creature), []).append(creature)
+        #Repeated and pruned creatures were not measured, penalties of failed tests
+        #are not samples of the rating
+        if creature.stop_reason not in {"repeated", "pruned"} and creature.failure is None:
+            Samples.setdefault(get_key(creature), []).append(creature.rating)
+    keys = [key for key in groups if key in Samples]
+    if not keys:
+        return []
+    top_size = min(top_size, len(keys))
+
+    while True:
+        means, errors, _ = get_statistics(keys)
+        order = numpy.argsort(means)
+        #Keys whose interval lies entirely above the interval of the last top rank are dominated
+        last = order[top_size - 1]
+        threshold = means[last] + config.racing_confidence * errors[last]
+        contenders = numpy.flatnonzero(means - config.racing_confidence * errors <= threshold)
+        #Once the top ranks are decided, their members are only measured until
+        #their variance is known
+        needed = 2 if len(contenders) <= top_size else config.racing_max_evaluations
+        #Failed measurements count against the evaluations of the key
+        sample = [keys[index] for index in contenders
+                  if len(Samples[keys[index]]) + failed.get(keys[index], 0) <
+                  min(needed, config.racing_max_evaluations)]
+        if not sample:
+            break
+        print(f"Racing {len(sample)} of {len(contenders)} contenders for the top {top_size}")
+        measured = [groups[key][0] for key in sample]
+        measure(measured)
+        for key, creature in zip(sample, measured):
+            if creature.failure is None:
+                Samples[key].append(creature.rating)
+            else:
+                failed[key] = failed.get(key, 0) + 1
+
+    means, _, deviations = get_statistics(keys)
+    summary = []
+    for key, mean, deviation in zip(keys, means, deviations):
+        rating = round(float(mean), 3)
+        update_cache(key, rating)
+        for creature in groups[key]:
+            creature.rating = rating
+            if creature.objectives:
+                creature.objectives = [rating] + creature.objectives[1:]
+        summary.append((key, len(Samples[key]), rating, round(float(deviation), 3)))
+    return summary
@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module indexing result directories and querying creatures across runs."""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import numpy
+from create_graph import create_scatter_plot
+from stability import redefine_to_stable_array
+
+RUN_PATTERN = re.compile(r'^(ptp4l|phc2sys|cascade)_(\d{8}-\d{6})$')
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (path TEXT PRIMARY KEY, app TEXT, timestamp TEXT,
+                                 interface TEXT, metric TEXT, duration INTEGER,
+                                 backend TEXT, settings TEXT, signature TEXT);
+CREATE TABLE IF NOT EXISTS creatures (run TEXT, epoch INTEGER, creature INTEGER,
+                                      k_p REAL, k_i REAL, rating REAL);
+CREATE TABLE IF NOT EXISTS elites (run TEXT, epoch INTEGER, k_p REAL, k_i REAL, rating REAL);
+CREATE INDEX IF NOT EXISTS creatures_run ON creatures (run);
+CREATE INDEX IF NOT EXISTS creatures_rating ON creatures (rating);
+CREATE INDEX IF NOT EXISTS elites_run ON elites (run);
+CREATE INDEX IF NOT EXISTS runs_query ON runs (app, interface, metric, duration);
+"""
+
+def open_index(filename):
+    """Function opening the index database."""
+    connection = sqlite3.connect(filename)
+    connection.executescript(SCHEMA)
+    return connection
+
+def get_signature(files):
+    """Function returning signature of the run files, changed when any file changes."""
+    parts = []
+    for filename in files:
+        if os.path.isfile(filename):
+            stat = os.stat(filename)
+            parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+        else:
+            parts.append("-")
+    return ";".join(parts)
+
+def read_rows(filename, columns):
+    """Function reading rows with the provided number of columns from the result CSV."""
+    rows = []
+    if not os.path.isfile(filename):
+        return rows
+    with open(filename, "r", encoding="utf-8") as file:
+        for parts in csv.reader(file):
+            if len(parts) != columns or parts[0] == "epoch":
+                continue
+            try:
+                rows.append([float(part) for part in parts])
+            except ValueError:
+                print(f"Skipping invalid line: {parts}")
+    return rows
+
+def index_run(connection, path, app, timestamp):
+    """Function (re)indexing a single run."""
+    csvfilename = os.path.join(path, f"{app}.csv")
+    elitefilename = os.path.join(path, f"{app}_elite.csv")
+    settingsfilename = os.path.join(path, f"{app}_settings.json")
+    settings = {}
+    if os.path.isfile(settingsfilename):
+        with open(settingsfilename, "r", encoding="utf-8") as settingsfile:
+            settings = json.load(settingsfile)
+
+    connection.execute("DELETE FROM creatures WHERE run = ?", (path,))
+    connection.execute("DELETE FROM elites WHERE run = ?", (path,))
+    connection.executemany("INSERT INTO creatures VALUES (?, ?, ?, ?, ?, ?)",
+                           ([path] + row for row in read_rows(csvfilename, 5)))
+    connection.executemany("INSERT INTO elites VALUES (?, ?, ?, ?, ?)",
+                           ([path] + row for row in read_rows(elitefilename, 4)))
+    connection.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (path, app, timestamp, settings.get("interface"),
+                        settings.get("metric"), settings.get("duration"),
+                        settings.get("backend"), json.dumps(settings),
+                        get_signature((csvfilename, elitefilename, settingsfilename))))
+
+def update_index(connection, root):
+    """Function indexing new and changed runs, returns number of indexed runs."""
+    known = dict(connection.execute("SELECT path, signature FROM runs"))
+    found = set()
+    updated = 0
+    for name in sorted(os.listdir(root)):
+        match = RUN_PATTERN.match(name)
+        path = os.path.join(root, name)
+        if not match or not os.path.isdir(path):
+            continue
+        found.add(path)
+        app = match.group(1)
+        signature = get_signature([os.path.join(path, f"{app}{suffix}")
+                                   for suffix in (".csv", "_elite.csv", "_settings.json")])
+        if known.get(path) == signature:
+            continue
+        index_run(connection, path, app, match.group(2))
+        updated = updated + 1
+
+    #Forget runs which were removed
+    for path in set(known) - found:
+        connection.execute("DELETE FROM runs WHERE path = ?", (path,))
+        connection.execute("DELETE FROM creatures WHERE run = ?", (path,))
+        connection.execute("DELETE FROM elites WHERE run = ?", (path,))
+    connection.commit()
+    return updated
+
+def build_filter(app=None, interface=None, metric=None, duration=None, backend=None):
+    """Function building SQL condition on the run settings."""
+    conditions = []
+    values = []
+    for column, value in (("app", app), ("interface", interface), ("metric", metric),
+                          ("duration", duration), ("backend", backend)):
+        if value is not None:
+            conditions.append(f"runs.{column} = ?")
+            values.append(value)
+    if not conditions:
+        return "1", values
+    return " AND ".join(conditions), values
+
+def query_top(connection, k=10, distinct=True, **filters):
+    """Function returning k best creatures of the matching runs."""
+    condition, values = build_filter(**filters)
+    if distinct:
+        query = f"""SELECT k_p, k_i, MIN(rating), COUNT(*), runs.path FROM creatures
+                    JOIN runs ON creatures.run = runs.path WHERE {condition}
+                    GROUP BY k_p, k_i ORDER BY MIN(rating) LIMIT ?"""
+    else:
+        query = f"""SELECT k_p, k_i, rating, 1, runs.path FROM creatures
+                    JOIN runs ON creatures.run = runs.path WHERE {condition}
+                    ORDER BY rating LIMIT ?"""
+    return connection.execute(query, values + [k]).fetchall()
+
+def query_best_per(connection, column, **filters):
+    """Function returning best creature for each value of the run setting column."""
+    condition, values = build_filter(**filters)
+    query = f"""SELECT runs.{column}, k_p, k_i, MIN(rating), runs.path FROM creatures
+                JOIN runs ON creatures.run = runs.path WHERE {condition}
+                GROUP BY runs.{column} ORDER BY runs.{column}"""
+    return connection.execute(query, values).fetchall()
+
+def query_warm_start(connection, size, min_distance, stability_log=None, **filters):
+    """Function returning up to size best stable k_p and k_i pairs of the matching runs."""
+    candidates = query_top(connection, -1, **filters)
+    if not candidates:
+        return [], []
+    k_p, k_i = redefine_to_stable_array([row[0] for row in candidates],
+                                        [row[1] for row in candidates], stability_log)
+
+    #Skip pairs too close to a better one already taken
+    taken = []
+    for index in range(len(candidates)):
+        if len(taken) == size:
+            break
+        if all(numpy.hypot(k_p[index] - k_p[other], k_i[index] - k_i[other]) >= min_distance
+               for other in taken):
+            taken.append(index)
+    return k_p[taken].tolist(), k_i[taken].tolist()
+
+def export_scatter_plot(connection, plot_filename, metric, **filters):
+    """Function creating scatter plot of the creatures of all matching runs."""
+    condition, values = build_filter(metric=metric, **filters)
+    rows = connection.execute(f"""SELECT epoch, creature, k_p, k_i, rating FROM creatures
+                                  JOIN runs ON creatures.run = runs.path WHERE {condition}""",
+                              values).fetchall()
+    if not rows:
+        print("No creatures match the query")
+        return
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False,
+                                     encoding="utf-8") as csvfile:
+        csvfile.write("epoch,creature,k_p,k_i,rating\n")
+        csvfile.writelines(",".join(str(value) for value in row) + "\n" for row in rows)
+    try:
+        create_scatter_plot(csvfile.name, plot_filename, metric or "Metric")
+    finally:
+        os.remove(csvfile.name)
+    print(f"Scatter plot of {len(rows)} creatures saved to {plot_filename}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index and query result directories")
+    parser.add_argument("--root", default=".", help="Directory holding the result directories")
+    parser.add_argument("--index", help="Index file, <root>/run_index.sqlite by default")
+    parser.add_argument("--app", choices=["ptp4l", "phc2sys", "cascade"],
+                        help="Only runs of the app")
+    parser.add_argument("--i", dest="interface", help="Only runs on the interface")
+    parser.add_argument("--metric", help="Only runs rated with the metric")
+    parser.add_argument("--t", dest="duration", type=int, help="Only runs with the test time")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("update", help="Index new and changed runs")
+    top_parser = subparsers.add_parser("top", help="Best creatures")
+    top_parser.add_argument("-k", type=int, default=10, help="Number of creatures")
+    top_parser.add_argument("--all", action="store_true",
+                            help="List repeated k_p and k_i pairs separately")
+    subparsers.add_parser("interfaces", help="Best creature per interface")
+    subparsers.add_parser("metrics", help="Best creature per metric")
+    scatter_parser = subparsers.add_parser("scatter", help="Scatter plot over all runs")
+    scatter_parser.add_argument("-o", "--output", default="scatter_plot_all.png",
+                                help="Plot filename")
+
+    args = parser.parse_args()
+    index = open_index(args.index or os.path.join(args.root, "run_index.sqlite"))
+    print(f"Indexed {update_index(index, args.root)} new or changed runs")
+    query_filters = {"app": args.app, "interface": args.interface, "duration": args.duration}
+
+    if args.command == "top":
+        for k_p, k_i, rating, count, path in query_top(index, args.k, not args.all,
+                                                       metric=args.metric, **query_filters):
+            print(f"k_p: {k_p} k_i: {k_i} Score: {rating} Tests: {count} Run: {path}")
+    elif args.command in {"interfaces", "metrics"}:
+        column = "interface" if args.command == "interfaces" else "metric"
+        for value, k_p, k_i, rating, path in query_best_per(index, column, metric=args.metric,
+                                                            **query_filters):
+            print(f"{column}: {value} k_p: {k_p} k_i: {k_i} Score: {rating} Run: {path}")
+    elif args.command == "scatter":
+        export_scatter_plot(index, args.output, args.metric, **query_filters)
+    index.close()
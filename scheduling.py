@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module pinning the servo under test and the optimizer to separate CPUs."""
+
+import argparse
+import os
+import shutil
+import subprocess #nosec
+import configureme as config
+
+SCHEDULING_FIELDS = ("servo_cpus", "servo_policy", "servo_priority", "orchestrator_cpus")
+
+def parse_cpu_list(text):
+    """Function returning set of CPUs of a list like 0-2,5."""
+    cpus = set()
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+def format_cpu_list(cpus, separator=","):
+    """Function formatting CPUs as a list like 0-2,5."""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return separator.join(f"{first}-{last}" if first != last else f"{first}"
+                          for first, last in ranges)
+
+def get_isolated_cpus():
+    """Function returning CPUs isolated from the scheduler with isolcpus."""
+    try:
+        with open("/sys/devices/system/cpu/isolated", "r", encoding="utf-8") as file:
+            return parse_cpu_list(file.read())
+    except OSError:
+        return set()
+
+def get_servo_cpus():
+    """Function returning CPUs of the servo under test."""
+    if config.low_jitter_servo_cpus is None:
+        return get_isolated_cpus()
+    return set(config.low_jitter_servo_cpus)
+
+def get_orchestrator_cpus():
+    """Function returning CPUs of the optimizer and post-processing."""
+    if config.low_jitter_orchestrator_cpus is None:
+        return set(range(os.cpu_count() or 1)) - get_servo_cpus()
+    return set(config.low_jitter_orchestrator_cpus)
+
+def get_servo_prefix():
+    """Function returning command prefix running the servo pinned with SCHED_FIFO priority."""
+    if config.low_jitter is not True:
+        return ""
+    return f"chrt -f {config.low_jitter_priority} " \
+           f"taskset -c {format_cpu_list(get_servo_cpus())} "
+
+def check_low_jitter():
+    """Function returning error of the low jitter settings, None if the servo can be pinned."""
+    servo_cpus = get_servo_cpus()
+    orchestrator_cpus = get_orchestrator_cpus()
+    online_cpus = set(range(os.cpu_count() or 1))
+    if not servo_cpus:
+        return "No isolated CPUs found, specify low jitter servo CPUs"
+    if not orchestrator_cpus:
+        return "No CPUs left for the optimizer, specify low jitter orchestrator CPUs"
+    if not servo_cpus | orchestrator_cpus <= online_cpus:
+        return f"Low jitter CPUs must be in 0-{max(online_cpus)}"
+    if servo_cpus & orchestrator_cpus:
+        return "Servo and optimizer CPUs must not overlap"
+    if not 1 <= config.low_jitter_priority <= 99:
+        return "SCHED_FIFO priority must be in 1-99"
+    for tool in ("chrt", "taskset"):
+        if shutil.which(tool) is None:
+            return f"{tool} not found, install util-linux"
+    #Real-time priority needs root or CAP_SYS_NICE
+    result = subprocess.run(f"{get_servo_prefix()}true", shell=True, check=False, #nosec
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    if result.returncode != 0:
+        return f"Cannot run the servo with SCHED_FIFO priority: {result.stderr.strip()}"
+    return None
+
+def pin_orchestrator():
+    """Function pinning the optimizer and the processes it starts to the orchestrator CPUs."""
+    os.sched_setaffinity(0, get_orchestrator_cpus())
+
+def get_scheduling():
+    """Function returning affinity and policy applied to the last test."""
+    if config.low_jitter is not True or config.backend != "hardware":
+        return {}
+    #CPU lists are stored in CSV files, so they are separated by spaces
+    return {"servo_cpus": format_cpu_list(get_servo_cpus(), " "), "servo_policy": "SCHED_FIFO",
+            "servo_priority": config.low_jitter_priority,
+            "orchestrator_cpus": format_cpu_list(os.sched_getaffinity(0), " ")}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Low jitter CPU pinning check")
+    parser.parse_args()
+
+    config.low_jitter = True
+    error = check_low_jitter()
+    print(f"Servo CPUs: {format_cpu_list(get_servo_cpus()) or '-'}, "
+          f"optimizer CPUs: {format_cpu_list(get_orchestrator_cpus()) or '-'}")
+    print(error or f"Servo command prefix: {get_servo_prefix()}")
@@ -22,9 +22,30 @@ setup(
    packages=['ptp-optimization'],
    install_requires=['numpy', 'scikit-learn', 'matplotlib', 'pandas'],
    scripts=[
+            'artifacts.py',
+            'benchmark.py',
+            'cascade.py',
+            'cmaes.py',
             'evaluate.py',
+            'ingest.py',
+            'inventory.py',
+            'island.py',
             'main.py',
+            'metrics.py',
             'parse_ptp.py',
-            'create_graph.py'
+            'create_graph.py',
+            'distributed.py',
+            'pareto.py',
+            'population.py',
+            'racing.py',
+            'run_index.py',
+            'scheduling.py',
+            'survey.py',
+            'simulator.py',
+            'stability.py',
+            'stopping.py',
+            'system_noise.py',
+            'timing_metrics.py',
+            'tuning_daemon.py'
            ]
 )
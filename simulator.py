@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module simulating PI servo disciplining a PTP hardware clock."""
+
+import argparse
+import os
+import numpy
+import configureme as config
+from artifacts import open_log
+from artifacts import get_artifact_name
+from artifacts import COMPRESSION_SUFFIXES
+
+def simulate_servo(k_p, k_i, duration, seed=None, reference=None, frequency=None):
+    """Function simulating servo, returns rows in the parse_ptp format.
+
+    The clock follows a reference whose frequency error [ppb] in each second is
+    given by the optional reference list, the frequency error of the disciplined
+    clock is appended to the optional frequency list."""
+    rng = numpy.random.default_rng(seed)
+    noise = rng.normal(0, config.sim_noise, duration)
+    wander = rng.normal(0, config.sim_wander, duration)
+    delay = rng.normal(config.sim_path_delay, config.sim_noise, duration)
+    freq_error = rng.uniform(-config.sim_freq_error, config.sim_freq_error)
+    offset = rng.uniform(-config.sim_initial_offset, config.sim_initial_offset)
+    start = 1000 + int(rng.integers(0, 100000))
+
+    rows = []
+    drift = 0
+    previous = None
+    for second in range(duration):
+        measured = offset + noise[second]
+        if second == 0:
+            #First sample, frequency is not known yet
+            state = 0
+            adj = 0
+        elif second == 1:
+            #Clock is stepped and drift is estimated from the two samples
+            state = 1
+            drift = measured - previous
+            offset = offset - measured
+            adj = drift
+        else:
+            state = 2
+            ki_term = k_i * measured
+            adj = k_p * measured + drift + ki_term
+            drift = drift + ki_term
+        adj = max(-config.sim_max_adj, min(adj, config.sim_max_adj))
+        drift = max(-config.sim_max_adj, min(drift, config.sim_max_adj))
+        previous = measured
+
+        rows.append([start + second, 0, state, int(round(measured)), int(round(-adj)),
+                     int(round(delay[second]))])
+        #Offset accumulates the uncorrected frequency error over one sync interval
+        freq_error = freq_error + wander[second]
+        offset = offset + freq_error - adj
+        if reference is not None:
+            offset = offset - reference[second]
+        if frequency is not None:
+            frequency.append(freq_error - adj)
+    return rows
+
+def format_row(app, row):
+    """Function formatting simulated row as a ptp4l or phc2sys log line."""
+    kernel_sec, kernel_nsec, state, offset, freq, path_delay = row
+    msec = kernel_nsec // 1000000
+    if app == "phc2sys":
+        return f"phc2sys[{kernel_sec}.{msec:03d}]: CLOCK_REALTIME phc offset {offset:>9d}"\
+               f" s{state} freq {freq:+7d} delay {path_delay:>6d}\n"
+    return f"ptp4l[{kernel_sec}.{msec:03d}]: master offset {offset:>10d}"\
+           f" s{state} freq {freq:+7d} path delay {path_delay:>9d}\n"
+
+def get_seed(k_p, k_i):
+    """Function returning simulation seed, fixed per gains if sim_seed is set."""
+    if config.sim_seed is None:
+        return None
+    return [config.sim_seed, int(round(k_p * 1000)), int(round(k_i * 1000))]
+
+def run_sim_test(app, P, I, timeout=60, stop_rule=None, name=None, workdir="."):
+    """Run the simulated test, writing the log the way the hardware tests do."""
+    name = name or get_artifact_name(app, P, I)
+    path = os.path.join(workdir, name)
+    if not os.path.exists(path):
+        os.mkdir(path)
+
+    suffix = COMPRESSION_SUFFIXES[config.artifact_compression]
+    with open_log(os.path.join(path, f"{name}.log{suffix}"), "w") as log_file:
+        for row in simulate_servo(P, I, timeout, get_seed(P, I)):
+            log_file.write(format_row(app, row))
+            if stop_rule and stop_rule.update(row):
+                break
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PTP servo simulator")
+    parser.add_argument("-t", "--timeout", type=int, default=60, help="Simulated test duration")
+    parser.add_argument("-P", type=float, required=True, help="P_VAL")
+    parser.add_argument("-I", type=float, required=True, help="I_VAL")
+    parser.add_argument("-a", "--app", default=config.app, choices=["ptp4l", "phc2sys"],
+                        help="Log format")
+
+    args = parser.parse_args()
+    run_sim_test(args.app, args.P, args.I, args.timeout)
@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+# Copyright (c) 2021 Intel
+# Copyright (C) 2023 Milena Olech <milena.olech(at)intel.com>
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Copyright (C) 2023 Maciek Machnikowski <maciek(at)machnikowski.net>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module providing PI servo stability verification."""
+
+import random
+import numpy
+import configureme as config
+
+def validate_stability(p_term, i_term):
+    """Function validating stability."""
+    if config.stability_verification == "Complex":
+        eq1 = (((p_term + i_term)*(p_term + i_term)) < (4*i_term))
+        eq2 = 0 <= i_term <= 4
+        eq3 = 0 <= p_term <= 1
+        if eq1 and eq2 and eq3:
+            return True
+        return False
+    if config.stability_verification == "Real":
+        eq1 = ((2*p_term) < (4 - i_term))
+        eq2 = 0 <= i_term <= 4
+        eq3 = 0 <= p_term <= 2
+        if eq1 and eq2 and eq3:
+            return True
+        return False
+    return True
+
+def draw_stable_kp_ki():
+    """Function drawing stable k_p and k_i pair."""
+    stable = False
+    if config.stability_verification == "Complex":
+        gen_max_kp_stable = config.gen_max_kp_stable_complex
+    else:
+        gen_max_kp_stable = config.gen_max_kp_stable_real
+    while not stable:
+        p_term = random.uniform(0, gen_max_kp_stable) #nosec
+        i_term = random.uniform(0, config.gen_max_ki_stable) #nosec
+        if validate_stability(p_term, i_term):
+            stable = True
+    return p_term, i_term
+
+def log_unstable(stability_log, p_term, i_term):
+    """Function appending unstable k_p and k_i pair to the stability log."""
+    if stability_log is None or config.debug_level == 1:
+        return
+    with open(stability_log, "a", encoding="utf-8") as stabilityfile:
+        stabilityfile.write(f"{i_term};{p_term}\n")
+
+def redefine_kp_ki_to_stable(p_term, i_term, stability_log=None):
+    """Function redefining k_p and k_i to stable."""
+    if validate_stability(p_term, i_term):
+        return p_term,i_term
+    stable = False
+    if config.stability_verification == "Complex":
+        while not stable:
+            log_unstable(stability_log, p_term, i_term)
+            if i_term < 1:
+                i_term = i_term + (1 - i_term) * config.reduction_determinant
+            if i_term > 1:
+                i_term = i_term - (i_term - 1) * config.reduction_determinant
+            if i_term == 0:
+                i_term = i_term + config.reduction_determinant
+            if p_term == 0:
+                p_term = p_term + config.reduction_determinant
+            p_term = p_term - (p_term * config.reduction_determinant)
+            i_term = round(i_term, 3)
+            p_term = round(p_term, 3)
+            if validate_stability(p_term, i_term):
+                stable = True
+        return p_term,i_term
+    if config.stability_verification == "Real":
+        while not stable:
+            log_unstable(stability_log, p_term, i_term)
+            i_term = i_term - (i_term * config.reduction_determinant)
+            p_term = p_term - (p_term * config.reduction_determinant)
+            if i_term <= 0:
+                i_term = i_term + config.reduction_determinant
+            if p_term <= 0:
+                p_term = p_term + config.reduction_determinant
+            i_term = round(i_term, 3)
+            p_term = round(p_term, 3)
+            if validate_stability(p_term, i_term):
+                stable = True
+        return p_term,i_term
+    return p_term,i_term
+
+def validate_stability_array(k_p, k_i):
+    """Function validating stability of k_p and k_i arrays."""
+    k_p = numpy.asarray(k_p, dtype=float)
+    k_i = numpy.asarray(k_i, dtype=float)
+    if config.stability_verification == "Complex":
+        return (((k_p + k_i) * (k_p + k_i)) < (4 * k_i)) & \
+               (0 <= k_i) & (k_i <= 4) & (0 <= k_p) & (k_p <= 1)
+    if config.stability_verification == "Real":
+        return ((2 * k_p) < (4 - k_i)) & \
+               (0 <= k_i) & (k_i <= 4) & (0 <= k_p) & (k_p <= 2)
+    return numpy.ones(numpy.broadcast(k_p, k_i).shape, dtype=bool)
+
+def draw_stable_array(size):
+    """Function drawing arrays of stable k_p and k_i pairs."""
+    if config.stability_verification == "Complex":
+        gen_max_kp_stable = config.gen_max_kp_stable_complex
+    else:
+        gen_max_kp_stable = config.gen_max_kp_stable_real
+    k_p = numpy.empty(0)
+    k_i = numpy.empty(0)
+    while len(k_p) < size:
+        #Draw twice as many pairs as missing, unstable ones are rejected
+        missing = 2 * (size - len(k_p))
+        new_kp = numpy.random.uniform(0, gen_max_kp_stable, missing)
+        new_ki = numpy.random.uniform(0, config.gen_max_ki_stable, missing)
+        stable = validate_stability_array(new_kp, new_ki)
+        k_p = numpy.concatenate((k_p, new_kp[stable]))
+        k_i = numpy.concatenate((k_i, new_ki[stable]))
+    return k_p[:size], k_i[:size]
+
+def redefine_to_stable_array(k_p, k_i, stability_log=None):
+    """Function redefining arrays of k_p and k_i to stable."""
+    k_p = numpy.array(k_p, dtype=float)
+    k_i = numpy.array(k_i, dtype=float)
+    unstable = ~validate_stability_array(k_p, k_i)
+    if config.stability_verification not in {"Complex", "Real"}:
+        return k_p, k_i
+
+    determinant = config.reduction_determinant
+    while unstable.any():
+        p_term = k_p[unstable]
+        i_term = k_i[unstable]
+        if stability_log is not None and config.debug_level != 1:
+            with open(stability_log, "a", encoding="utf-8") as stabilityfile:
+                stabilityfile.writelines(f"{i};{p}\n" for p, i in zip(p_term, i_term))
+        if config.stability_verification == "Complex":
+            i_term = numpy.where(i_term < 1, i_term + (1 - i_term) * determinant, i_term)
+            i_term = numpy.where(i_term > 1, i_term - (i_term - 1) * determinant, i_term)
+            i_term = numpy.where(i_term == 0, i_term + determinant, i_term)
+            p_term = numpy.where(p_term == 0, p_term + determinant, p_term)
+            p_term = p_term - (p_term * determinant)
+        else:
+            i_term = i_term - (i_term * determinant)
+            p_term = p_term - (p_term * determinant)
+            i_term = numpy.where(i_term <= 0, i_term + determinant, i_term)
+            p_term = numpy.where(p_term <= 0, p_term + determinant, p_term)
+        k_p[unstable] = numpy.round(p_term, 3)
+        k_i[unstable] = numpy.round(i_term, 3)
+        unstable[unstable] = ~validate_stability_array(k_p[unstable], k_i[unstable])
+    return k_p, k_i
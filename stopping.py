@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module providing statistical stopping rule for adaptive test duration."""
+
+import math
+import configureme as config
+
+class AdaptiveStop():
+    """Stopping rule ending the test once the metric confidence interval is tight.
+
+    Offsets are grouped into batches of adaptive_batch_size locked samples and
+    the interval is built from the batch means, which keeps it valid for the
+    strongly autocorrelated servo offset."""
+
+    def __init__(self, elite_rating=None, metric=None):
+        """Init function."""
+        self.metric = metric if metric is not None else config.metric
+        self.elite_rating = elite_rating
+        self.start = None
+        self.duration = 0
+        self.reason = "timeout"
+        self.batch_sum = 0
+        self.batch_count = 0
+        self.batches = 0
+        self.mean = 0
+        self.m2 = 0
+
+    def add_sample(self, offset):
+        """Function adding locked sample to the running estimate."""
+        if self.metric == "MAE":
+            self.batch_sum = self.batch_sum + abs(offset)
+        else:
+            self.batch_sum = self.batch_sum + offset * offset
+        self.batch_count = self.batch_count + 1
+        if self.batch_count < config.adaptive_batch_size:
+            return
+
+        #Welford update over the batch means
+        batch_mean = self.batch_sum / self.batch_count
+        self.batches = self.batches + 1
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta / self.batches
+        self.m2 = self.m2 + delta * (batch_mean - self.mean)
+        self.batch_sum = 0
+        self.batch_count = 0
+
+    def get_interval(self):
+        """Function returning confidence interval of the metric."""
+        if self.batches < 2:
+            return -math.inf, math.inf
+        half_width = config.adaptive_confidence * math.sqrt(self.m2 / (self.batches - 1)
+                                                            / self.batches)
+        low = max(0, self.mean - half_width)
+        high = self.mean + half_width
+        if self.metric == "RMSE":
+            return math.sqrt(low), math.sqrt(high)
+        return low, high
+
+    def update(self, row):
+        """Function feeding parsed log row, returns True when the test can stop."""
+        timestamp = row[0] + row[1] / 1000000000
+        if self.start is None:
+            self.start = timestamp
+        self.duration = round(timestamp - self.start, 3)
+
+        #Transient samples before lock are not rated
+        if row[2] not in (2, 3):
+            return False
+        self.add_sample(row[3])
+
+        if self.duration < config.adaptive_min_duration or self.batches < 2:
+            return False
+
+        low, high = self.get_interval()
+        if self.elite_rating is not None and low > self.elite_rating:
+            self.reason = "worse than elite"
+            return True
+        if self.elite_rating is not None and high < self.elite_rating:
+            self.reason = "better than elite"
+            return True
+        if (high - low) / 2 <= config.adaptive_precision * (high + low) / 2:
+            self.reason = "precision"
+            return True
+        return False
@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module surveying a coarse grid of stable gains into a cached response surface."""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import numpy
+import configureme as config
+import evaluate
+from evaluate import Creature
+from create_graph import create_scatter_plot
+from inventory import get_interfaces
+from run_index import open_index
+from run_index import update_index
+from run_index import query_top
+from stability import validate_stability_array
+
+#Number of the nearest surveyed points interpolated into a prediction
+NEIGHBOURS = 4
+
+def get_gain_bounds():
+    """Function returning max k_p and k_i considered with the stability verification."""
+    if config.stability_verification == "Complex":
+        return config.gen_max_kp_stable_complex, config.gen_max_ki_stable
+    if config.stability_verification == "Real":
+        return config.gen_max_kp_stable_real, config.gen_max_ki_stable
+    return config.gen_max_kp, config.gen_max_ki
+
+def get_grid(size):
+    """Function returning k_p and k_i of the stable points of a size x size grid."""
+    max_kp, max_ki = get_gain_bounds()
+    k_p, k_i = numpy.meshgrid(numpy.linspace(0, max_kp, size), numpy.linspace(0, max_ki, size))
+    stable = validate_stability_array(k_p, k_i)
+    return numpy.round(k_p[stable], 3), numpy.round(k_i[stable], 3)
+
+def get_survey_filename(interface, duration):
+    """Function returning cached survey file of the app, evaluator, metric and duration."""
+    evaluator = interface if config.backend == "hardware" else config.backend
+    return os.path.join(config.survey_path,
+                        f"{config.app}_{evaluator}_{config.metric}_{duration}.csv")
+
+def write_survey(filename, k_p, k_i, ratings):
+    """Function writing surveyed points in the results CSV format."""
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    with open(filename, "w", encoding="utf-8") as csvfile:
+        csvfile.write("epoch,creature,k_p,k_i,rating\n")
+        for index, (p_term, i_term, rating) in enumerate(zip(k_p, k_i, ratings)):
+            csvfile.write(f"0,{index},{p_term},{i_term},{rating}\n")
+
+def run_survey(interface, duration, size, filename):
+    """Function testing every stable point of the grid and storing the ratings."""
+    k_p, k_i = get_grid(size)
+    work_path = evaluate.Work_path
+    evaluate.Work_path = os.path.join(config.survey_path, "work")
+    ratings = []
+    try:
+        for index, (p_term, i_term) in enumerate(zip(k_p, k_i)):
+            print(f"Survey point {index + 1}/{len(k_p)}: k_p {p_term:.3f}, k_i {i_term:.3f} ",
+                  end="", flush=True)
+            creature = Creature(float(p_term), float(i_term))
+            #Survey tests may be shorter than the tuning ones and are not cached
+            creature.evaluate_data(interface, duration, repeat=True)
+            shutil.rmtree(creature.workspace, ignore_errors=True)
+            print(f"Score: {creature.rating}")
+            #Penalties of failed tests are stored as missing ratings
+            ratings.append(creature.rating if creature.failure is None else float("nan"))
+    finally:
+        shutil.rmtree(evaluate.Work_path, ignore_errors=True)
+        evaluate.Work_path = work_path
+    write_survey(filename, k_p, k_i, ratings)
+
+def replay_survey(interface, duration, filename, root="."):
+    """Function building the survey from the creatures of indexed runs instead of tests."""
+    index = open_index(os.path.join(root, "run_index.sqlite"))
+    update_index(index, root)
+    rows = query_top(index, -1, app=config.app, interface=interface, metric=config.metric,
+                     duration=duration, backend=config.backend)
+    index.close()
+    if not rows:
+        print("No indexed runs match the survey")
+        return False
+    write_survey(filename, [row[0] for row in rows], [row[1] for row in rows],
+                 [row[2] for row in rows])
+    return True
+
+class ResponseSurface():
+    """Rating predicted from the surveyed points by inverse distance weighting."""
+
+    def __init__(self, filename):
+        """Init function."""
+        data = numpy.genfromtxt(filename, delimiter=",", skip_header=1).reshape(-1, 5)
+        #Failed tests do not shape the surface
+        data = data[numpy.isfinite(data[:,4])]
+        self.k_p = data[:,2]
+        self.k_i = data[:,3]
+        self.rating = data[:,4]
+        self.scale = numpy.array(get_gain_bounds(), dtype=float)
+
+    def __len__(self):
+        return len(self.rating)
+
+    def predict(self, k_p, k_i):
+        """Function predicting ratings of the k_p and k_i arrays."""
+        k_p = numpy.atleast_1d(numpy.asarray(k_p, dtype=float))
+        k_i = numpy.atleast_1d(numpy.asarray(k_i, dtype=float))
+        #Distances are measured relative to the gain ranges
+        distance = numpy.hypot((k_p[:,None] - self.k_p) / self.scale[0],
+                               (k_i[:,None] - self.k_i) / self.scale[1])
+        count = min(NEIGHBOURS, len(self))
+        nearest = numpy.argsort(distance, axis=1)[:,:count]
+        nearest_distance = numpy.take_along_axis(distance, nearest, axis=1)
+        weights = 1 / numpy.maximum(nearest_distance, 1e-9) ** 2
+        return numpy.sum(weights * self.rating[nearest], axis=1) / numpy.sum(weights, axis=1)
+
+    def best(self, size):
+        """Function returning k_p and k_i of the size best surveyed points."""
+        order = numpy.argsort(self.rating)[:size]
+        return self.k_p[order].tolist(), self.k_i[order].tolist()
+
+    def plot(self, plot_filename, resolution=40):
+        """Function rendering the surface over a dense stable grid as a heatmap."""
+        k_p, k_i = get_grid(resolution)
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False,
+                                         encoding="utf-8") as csvfile:
+            csvfile.write("epoch,creature,k_p,k_i,rating\n")
+            csvfile.writelines(f"0,{index},{p_term},{i_term},{rating}\n"
+                               for index, (p_term, i_term, rating)
+                               in enumerate(zip(k_p, k_i, self.predict(k_p, k_i))))
+        try:
+            create_scatter_plot(csvfile.name, plot_filename, config.metric, marker_size=12)
+        finally:
+            os.remove(csvfile.name)
+
+def load_survey(interface, duration):
+    """Function returning the cached response surface, surveying the grid if missing."""
+    filename = get_survey_filename(interface, duration)
+    if not os.path.isfile(filename):
+        print(f"Surveying {config.survey_grid}x{config.survey_grid} grid into {filename}...")
+        run_survey(interface, duration, config.survey_grid, filename)
+    surface = ResponseSurface(filename)
+    if len(surface) == 0:
+        print(f"Survey {filename} has no rated points")
+        return None
+    return surface
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response surface survey of stable gains")
+    parser.add_argument("--i", type=str, choices=get_interfaces(), help="Interface")
+    parser.add_argument("--t", type=int, default=config.survey_duration,
+                        help="Duration of a survey test")
+    parser.add_argument("--grid", type=int, default=config.survey_grid,
+                        help="Number of k_p and k_i values of the grid")
+    parser.add_argument("--replay", action="store_true",
+                        help="Build the survey from indexed runs of the same duration")
+    parser.add_argument("--refresh", action="store_true", help="Survey again if cached")
+    parser.add_argument("-o", "--output", help="Heatmap filename")
+
+    args = parser.parse_args()
+    survey_filename = get_survey_filename(args.i, args.t)
+    if args.replay:
+        if not replay_survey(args.i, args.t, survey_filename):
+            sys.exit(1)
+    elif args.refresh or not os.path.isfile(survey_filename):
+        run_survey(args.i, args.t, args.grid, survey_filename)
+    survey_surface = ResponseSurface(survey_filename)
+    print(f"Survey {survey_filename}: {len(survey_surface)} points")
+    survey_surface.plot(args.output or survey_filename.replace(".csv", ".png"))
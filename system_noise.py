@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module sampling system counters during a test to detect noisy measurements."""
+
+import glob
+import os
+import time
+import configureme as config
+
+NOISE_FIELDS = ("load", "cpu_freq", "nic_irq_rate", "net_rx_rate", "timer_rate",
+                "ctxt_rate", "noisy")
+
+def read_load():
+    """Function returning 1 minute load average per CPU."""
+    with open("/proc/loadavg", "r", encoding="utf-8") as file:
+        return float(file.read().split()[0]) / (os.cpu_count() or 1)
+
+def read_cpu_freq():
+    """Function returning mean current CPU frequency in MHz, 0 if not available."""
+    frequencies = []
+    for filename in glob.glob("/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq"):
+        with open(filename, "r", encoding="utf-8") as file:
+            frequencies.append(int(file.read()) / 1000)
+    if not frequencies:
+        return 0
+    return sum(frequencies) / len(frequencies)
+
+def get_irq_names(interface):
+    """Function returning names identifying the interrupts of the interface."""
+    if not interface:
+        return []
+    names = [interface]
+    #MSI-X vectors may be named after the PCI address of the adapter
+    device = os.path.realpath(f"/sys/class/net/{interface}/device")
+    if os.path.exists(device):
+        names.append(os.path.basename(device))
+    return names
+
+def read_interrupts(names):
+    """Function returning sum of interrupts whose description contains one of the names."""
+    total = 0
+    with open("/proc/interrupts", "r", encoding="utf-8") as file:
+        cpus = len(file.readline().split())
+        for line in file:
+            parts = line.split()
+            if names and any(name in line for name in names):
+                total = total + sum(int(part) for part in parts[1:cpus + 1] if part.isdigit())
+    return total
+
+def read_softirqs():
+    """Function returning total NET_RX and TIMER softirqs."""
+    counters = {}
+    with open("/proc/softirqs", "r", encoding="utf-8") as file:
+        for line in file:
+            parts = line.split()
+            if parts[0] in {"NET_RX:", "TIMER:"}:
+                counters[parts[0][:-1]] = sum(int(part) for part in parts[1:])
+    return counters.get("NET_RX", 0), counters.get("TIMER", 0)
+
+def read_ctxt():
+    """Function returning number of context switches since boot."""
+    with open("/proc/stat", "r", encoding="utf-8") as file:
+        for line in file:
+            if line.startswith("ctxt"):
+                return int(line.split()[1])
+    return 0
+
+class NoiseSampler():
+    """Sampler of the system counters over the measurement window of a test."""
+
+    def __init__(self, interface=None):
+        """Init function."""
+        self.irq_names = get_irq_names(interface)
+        self.start_time = time.monotonic()
+        self.start_freq = read_cpu_freq()
+        self.start_irqs = read_interrupts(self.irq_names)
+        self.start_net_rx, self.start_timer = read_softirqs()
+        self.start_ctxt = read_ctxt()
+
+    def stop(self):
+        """Function returning counters of the window and whether it was noisy."""
+        elapsed = max(time.monotonic() - self.start_time, 1e-3)
+        net_rx, timer = read_softirqs()
+        noise = {"load": round(read_load(), 3),
+                 "cpu_freq": round((self.start_freq + read_cpu_freq()) / 2),
+                 "nic_irq_rate": round((read_interrupts(self.irq_names) - self.start_irqs)
+                                       / elapsed, 1),
+                 "net_rx_rate": round((net_rx - self.start_net_rx) / elapsed, 1),
+                 "timer_rate": round((timer - self.start_timer) / elapsed, 1),
+                 "ctxt_rate": round((read_ctxt() - self.start_ctxt) / elapsed, 1)}
+        noise["noisy"] = is_noisy(noise)
+        return noise
+
+def is_noisy(noise):
+    """Function checking the counters against the configured limits."""
+    if config.noise_max_load is not None and noise["load"] > config.noise_max_load:
+        return True
+    if config.noise_max_ctxt_rate is not None and \
+       noise["ctxt_rate"] > config.noise_max_ctxt_rate:
+        return True
+    if config.noise_max_nic_irq_rate is not None and \
+       noise["nic_irq_rate"] > config.noise_max_nic_irq_rate:
+        return True
+    return False
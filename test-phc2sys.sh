@@ -15,6 +15,9 @@ do
 	-c) C_VAL="$2"; shift ;;
 	-P) P_VAL="$2"; shift ;;
 	-I) I_VAL="$2"; shift ;;
+	-e|--extra) EXTRA="$2"; shift ;;
+	-d|--dir) NAME="$2"; shift ;;
+	-w|--wrap) WRAP="$2"; shift ;;
 	-v|--verbose) VERBOSE=1 ;;
 #	-o|--offset) OFFSET=$2; shift;;
         *) echo "Unknown parameter passed: $1"; exit 1 ;;
@@ -67,6 +70,11 @@ CMD="phc2sys -s $S_VAL -m -c $C_VAL -O 0 -N 20"
 DIR="phc2sys"
 [ -n $P_VAL ] && CMD=$CMD" -P $P_VAL" DIR=$DIR"_P$P_VAL"
 [ -n $I_VAL ] && CMD=$CMD" -I $I_VAL" DIR=$DIR"_I$I_VAL"
+#Extra servo options are added last to override the defaults above
+[ -n "$EXTRA" ] && CMD="$CMD $EXTRA"
+[ -n "$NAME" ] && DIR=$NAME
+#Wrapper pinning phc2sys, e.g. chrt and taskset, the parsing below is not wrapped
+[ -n "$WRAP" ] && CMD="$WRAP $CMD"
 [ -n $TIMEOUT ] && CMD="timeout $TIMEOUT $CMD"
 CMD="$CMD > $DIR.log"
 
@@ -85,6 +93,11 @@ eval $CMD
 #chmod 600 "$DIR.log"
 
 [[ ! -d "$DIR" && ! -L "$DIR" && ! -f "$DIR" ]] && mkdir $DIR
-python3 parse_ptp.py --input $DIR.log --plot
+#Unlocked and empty logs are rated by the caller, they have no plot
+python3 "$(dirname "$0")/parse_ptp.py" --input $DIR.log --plot || true
 mv $DIR.log $DIR
-mv test.png $DIR/$DIR.png
\ No newline at end of file
+if [ -f test.png ]
+then
+	mv test.png $DIR/$DIR.png
+fi
+exit 0
@@ -8,35 +8,22 @@
 import argparse
 import subprocess
 import os
-import shutil
+import signal
 import sys
 import parse_ptp as parse
+from artifacts import store_log
+from artifacts import get_artifact_name
+from inventory import get_phc_index
+from inventory import get_interfaces
+from scheduling import get_servo_prefix
 
-def get_phc_index(interface_name):
-    try:
-        # Run the ethtool command to get the PHC index
-        result = subprocess.check_output(['ethtool', '-T', interface_name],
-                                         stderr=subprocess.STDOUT,
-                                         universal_newlines=True)
-
-        # Parse the output to find the PHC index
-        lines = result.split('\n')
-        for line in lines:
-            if "PTP Hardware Clock:" in line:
-                parts = line.strip().split()
-                if len(parts) >= 4:
-                    return int(parts[3])
-
-        # If the PHC index is not found, return None
-        return None
-    except subprocess.CalledProcessError as e:
-        print(f"Error: {e}")
-        return None
+# ptp4l error printed when a transmitted timestamp is not delivered in time
+TIMEOUT_MESSAGE = "timed out while polling for tx timestamp"
 
 def reset_ptp_clock(interface, reset_method="ptp4l"):
     """Reset the PTP clock."""
     # Check if the network interface exists
-    if not os.path.exists(f"/sys/class/net/{interface}"):
+    if interface not in get_interfaces():
         print(f"Adapter {interface} does not exist.")
         sys.exit(1)
 
@@ -62,14 +49,31 @@ def reset_ptp_clock(interface, reset_method="ptp4l"):
     # Execute the clock reset command
     subprocess.run(reset_cmd, shell=True)
 
+def run_with_stop_rule(cmd, log_filename, stop_rule, parse_line):
+    """Run the command logging its output until the stop rule ends the test."""
+    with open(log_filename, "w", encoding="utf-8") as log_file:
+        with subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, universal_newlines=True,
+                              start_new_session=True) as process:
+            for line in process.stdout:
+                log_file.write(line)
+                row = parse_line(line.strip())
+                if row and stop_rule.update(row):
+                    os.killpg(process.pid, signal.SIGTERM)
+                    break
+            process.wait()
+
 def run_ptp_test(interface, P=None, I=None, offset_threshold=None,
                  config_file=None, timeout=60, verbose=False, cut_first=None,
-                 reset_method="ptp4l"):
-    """Run the ptp4l test."""
+                 reset_method="ptp4l", stop_rule=None, servo_options=None, name=None,
+                 workdir="."):
+    """Run the ptp4l test in the working directory, ended early by the optional stop rule."""
     reset_ptp_clock(interface, reset_method)
+    log_filename = os.path.join(workdir, "ptp4l.log")
+    stable_filename = os.path.join(workdir, "ptp4l-stable.log")
 
     # Build the main ptp4l command
-    ptp4l_cmd = f"ptp4l -i {interface} -m -2 -s --tx_timestamp_timeout 100"
+    ptp4l_cmd = f"{get_servo_prefix()}ptp4l -i {interface} -m -2 -s --tx_timestamp_timeout 100"
 
     if P:
         ptp4l_cmd += f" --pi_proportional_const {P}"
@@ -83,11 +87,12 @@ def run_ptp_test(interface, P=None, I=None, offset_threshold=None,
     if config_file:
         ptp4l_cmd += f" -f {config_file}"
 
+    if servo_options:
+        ptp4l_cmd += f" {servo_options}"
+
     if timeout:
         ptp4l_cmd = f"timeout {timeout} {ptp4l_cmd}"
 
-    ptp4l_cmd += " > ptp4l.log 2>/dev/null"
-
     if verbose:
         print("CMD:", ptp4l_cmd)
         print("TIMEOUT:", timeout)
@@ -96,43 +101,51 @@ def run_ptp_test(interface, P=None, I=None, offset_threshold=None,
         print("verbose:", verbose)
 
     # Execute the main ptp4l command
-    subprocess.run(ptp4l_cmd, shell=True)
+    if stop_rule:
+        run_with_stop_rule(ptp4l_cmd, log_filename, stop_rule, parse.parse_ptp4l_out)
+    else:
+        subprocess.run(f"{ptp4l_cmd} > {log_filename} 2>&1", shell=True)
 
     # Process the log file
-    with open("ptp4l.log", "r", encoding="utf-8") as log_file:
+    with open(log_filename, "r", encoding="utf-8") as log_file:
         lines = log_file.readlines()
 
     filtered_lines = []
+    timeout_lines = []
     for line in lines:
         if "master offset" in line:
             filtered_lines.append(line)
+        elif TIMEOUT_MESSAGE in line:
+            timeout_lines.append(line)
 
     if cut_first:
         filtered_lines = filtered_lines[cut_first:]
+    # timestamp timeouts explain failed tests, they are not offset samples
+    filtered_lines = filtered_lines + timeout_lines
 
     if offset_threshold:
-        with open("ptp4l.log", "w", encoding="utf-8") as log_file:
+        with open(log_filename, "w", encoding="utf-8") as log_file:
             log_file.writelines(filtered_lines)
 
-        with open("ptp4l.log", "r", encoding="utf-8") as log_file:
+        with open(log_filename, "r", encoding="utf-8") as log_file:
             lines = log_file.readlines()
 
         stable_lines = [line for line in lines if "s3" in line]
 
-        with open("ptp4l-stable.log", "w", encoding="utf-8") as stable_file:
+        with open(stable_filename, "w", encoding="utf-8") as stable_file:
             stable_file.writelines(stable_lines)
     else:
-        with open("ptp4l.log", "w", encoding="utf-8") as log_file:
+        with open(log_filename, "w", encoding="utf-8") as log_file:
             log_file.writelines(filtered_lines)
 
-    path = f"ptp4l_P{P}_I{I}"
+    name = name or get_artifact_name("ptp4l", P, I)
+    path = os.path.join(workdir, name)
     if not os.path.exists(path):
         os.mkdir(path)
 
-    array = parse.parse_file("ptp4l.log", 1)
-    parse.plot(array)
-    shutil.move("test.png", os.path.join(path, f'ptp4l_P{P}_I{I}.png'))
-    shutil.move("ptp4l.log", os.path.join(path, f'ptp4l_P{P}_I{I}.log'))
+    array = parse.parse_file(log_filename, 1)
+    parse.plot(array, os.path.join(path, f'{name}.png'))
+    store_log(log_filename, os.path.join(path, f'{name}.log'))
 
 def main(args):
     """Main function."""
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Tests classifying failed phc2sys tests run through test-phc2sys.sh."""
+
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import configureme as config
+import evaluate
+
+UNLOCKED_LOG = "".join(f"phc2sys[{second}.000]: CLOCK_REALTIME phc offset 5000 s0 freq 0 "
+                       f"delay 500\n" for second in range(1, 6))
+
+class Phc2sysFailureTest(unittest.TestCase):
+    """Failures of phc2sys tests with a fake phc2sys printing the given log."""
+
+    def setUp(self):
+        """Function installing fake phc2sys and switching config to phc2sys tests."""
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, "output.log")
+        phc2sys = os.path.join(self.directory, "phc2sys")
+        with open(phc2sys, "w", encoding="utf-8") as script:
+            script.write(f"#!/bin/sh\ncat {self.output}\n")
+        os.chmod(phc2sys, os.stat(phc2sys).st_mode | stat.S_IEXEC)
+        self.path = os.environ["PATH"]
+        os.environ["PATH"] = self.directory + os.pathsep + self.path
+        self.saved = {name: getattr(config, name) for name in ("app", "backend", "low_jitter")}
+        config.app, config.backend, config.low_jitter = "phc2sys", "hardware", False
+
+    def tearDown(self):
+        """Function restoring config and PATH."""
+        for name, value in self.saved.items():
+            setattr(config, name, value)
+        os.environ["PATH"] = self.path
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_failure(self, log):
+        """Function running the test of the log, returns failure."""
+        with open(self.output, "w", encoding="utf-8") as output:
+            output.write(log)
+        creature = evaluate.Creature(0.7, 0.3)
+        creature.workspace = tempfile.mkdtemp(dir=self.directory)
+        failure = creature.run_test("CLOCK_REALTIME", 5)
+        if failure is None:
+            failure = creature.get_failure(creature.get_data_from_file())
+        return failure
+
+    def test_unlocked_log(self):
+        """Servo which never locked is no_lock."""
+        self.assertEqual(self.get_failure(UNLOCKED_LOG), "no_lock")
+
+    def test_empty_log(self):
+        """Log without offset lines is empty_log."""
+        self.assertEqual(self.get_failure(""), "empty_log")
+
+if __name__ == "__main__":
+    unittest.main()
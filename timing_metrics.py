@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module calculating ITU-T timing metrics (MTIE, TDEV) of the offset."""
+
+import argparse
+from collections import deque
+import numpy
+import configureme as config
+import parse_ptp
+
+def get_sample_interval(result_array):
+    """Function returning sample interval in seconds of the parsed log."""
+    if len(result_array) < 2:
+        return 1
+    timestamps = result_array[:,0] + result_array[:,1] / 1000000000
+    interval = float(numpy.median(numpy.diff(timestamps)))
+    return interval if interval > 0 else 1
+
+def get_window_samples(window, sample_interval):
+    """Function returning number of sample intervals in the observation window."""
+    return max(1, int(round(window / sample_interval)))
+
+def mtie(offsets, samples):
+    """Function calculating MTIE over windows of samples + 1 points in O(n)."""
+    maxima = deque()
+    minima = deque()
+    result = 0
+    for index, offset in enumerate(offsets):
+        #Deques keep indexes of decreasing maxima and increasing minima of the window
+        while maxima and offsets[maxima[-1]] <= offset:
+            maxima.pop()
+        maxima.append(index)
+        while minima and offsets[minima[-1]] >= offset:
+            minima.pop()
+        minima.append(index)
+        if maxima[0] <= index - samples - 1:
+            maxima.popleft()
+        if minima[0] <= index - samples - 1:
+            minima.popleft()
+        if index >= samples:
+            result = max(result, offsets[maxima[0]] - offsets[minima[0]])
+    return float(result)
+
+def tdev(offsets, samples):
+    """Function calculating TDEV of the observation interval of samples from cumulative sums."""
+    offsets = numpy.asarray(offsets, dtype=float)
+    count = len(offsets) - 3 * samples + 1
+    if count < 1:
+        return numpy.nan
+    cumulative = numpy.concatenate(([0], numpy.cumsum(offsets)))
+    start = numpy.arange(count)
+    #Sum of the second differences over n consecutive samples
+    sums = (cumulative[start + 3 * samples] - cumulative[start + 2 * samples]) \
+        - 2 * (cumulative[start + 2 * samples] - cumulative[start + samples]) \
+        + (cumulative[start + samples] - cumulative[start])
+    return float(numpy.sqrt(numpy.sum(sums ** 2) / (6 * samples ** 2 * count)))
+
+def timing_metric(offsets, metric, window, sample_interval=1):
+    """Function calculating MTIE or TDEV of the observation window in seconds."""
+    samples = get_window_samples(window, sample_interval)
+    if metric == "MTIE":
+        if len(offsets) <= samples:
+            return numpy.nan
+        return mtie(list(offsets), samples)
+    return tdev(offsets, samples)
+
+def rate_timing(offsets, metric, sample_interval=1):
+    """Function rating offsets with the worst MTIE or TDEV relative to the configured limits."""
+    limits = config.timing_limits.get(metric) or [1] * len(config.timing_windows)
+    ratios = [timing_metric(offsets, metric, window, sample_interval) / limit
+              for window, limit in zip(config.timing_windows, limits)]
+    ratios = [ratio for ratio in ratios if not numpy.isnan(ratio)]
+    if not ratios:
+        print(f"Test too short for {metric} windows {config.timing_windows}")
+        return float("inf")
+    return round(max(ratios), 3)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MTIE and TDEV of the offset")
+    parser.add_argument("-i", "--input", required=True, help="Log file")
+    parser.add_argument("-w", "--windows", type=float, nargs="+",
+                        default=config.timing_windows, help="Observation windows [s]")
+
+    args = parser.parse_args()
+    convergence = {}
+    array = numpy.atleast_2d(parse_ptp.parse_file(args.input, convergence=convergence))
+    interval = get_sample_interval(array)
+    #Samples before the servo locked are not rated
+    array = array[convergence["lock_index"] or 0:]
+    for observation_window in args.windows:
+        print(f"Window {observation_window} s: "
+              f"MTIE {timing_metric(array[:,3], 'MTIE', observation_window, interval):.3f} ns "
+              f"TDEV {timing_metric(array[:,3], 'TDEV', observation_window, interval):.3f} ns")
@@ -0,0 +1,235 @@
+#!/usr/bin/python3
+# Copyright (C) 2023 Marta Plantykow <m.plantykow(at)gmail.com>
+# Licensed under the GNU General Public License v2.0 or later (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     https://spdx.org/licenses/GPL-2.0-or-later.html
+"""Module providing online re-tuning of a production PTP servo."""
+
+import argparse
+import os
+import random
+import re
+import subprocess #nosec
+import sys
+import time
+from shlex import split
+import configureme as config
+import evaluate
+from evaluate import Creature
+from evaluate import rate_data
+from evaluate import CONVERGENCE_METRICS
+from artifacts import ArtifactStore
+from ingest import read_ports
+from ingest import select_port
+from stability import redefine_kp_ki_to_stable
+
+def log_event(logfilename, message):
+    """Function printing and logging daemon event."""
+    line = f"{time.strftime('%Y-%m-%d %H:%M:%S')} {message}"
+    print(line)
+    with open(logfilename, "a", encoding="utf-8") as logfile:
+        logfile.write(line + "\n")
+
+def read_production_offsets(filename, window, start=0):
+    """Function reading master offsets of the most recent locked samples."""
+    #The log was rotated since the start position was taken
+    if start > os.path.getsize(filename):
+        start = 0
+    rows = select_port(read_ports(filename, start), config.log_port)
+    #Only locked samples describe the production performance
+    locked = rows[(rows[:,2] == 2) | (rows[:,2] == 3)]
+    return locked[-window:,3].tolist()
+
+def rate_production(filename, start=0):
+    """Function rating the production servo, None if it is not locked."""
+    offsets = read_production_offsets(filename, config.daemon_window, start)
+    if not offsets:
+        return None
+    return rate_data(offsets)
+
+def in_maintenance_window(now=None):
+    """Function checking if local search is allowed at the given time."""
+    if config.daemon_maintenance_window is None:
+        return True
+    if now is None:
+        now = time.localtime()
+    minutes = now.tm_hour * 60 + now.tm_min
+    begin, end = [int(part[0]) * 60 + int(part[1])
+                  for part in (value.split(":") for value in config.daemon_maintenance_window)]
+    if begin <= end:
+        return begin <= minutes < end
+    #The window spans midnight
+    return minutes >= begin or minutes < end
+
+def draw_neighbours(k_p, k_i):
+    """Function drawing stable candidates around the current gains."""
+    candidates = []
+    attempts = 0
+    while len(candidates) < config.daemon_search_size and \
+          attempts < 100 * config.daemon_search_size:
+        attempts = attempts + 1
+        new_kp = k_p + random.uniform(-1, 1) * config.daemon_search_step #nosec
+        new_ki = k_i + random.uniform(-1, 1) * config.daemon_search_step #nosec
+        new_kp = max(0, min(new_kp, config.gen_max_kp))
+        new_ki = max(0, min(new_ki, config.gen_max_ki))
+        new_kp, new_ki = redefine_kp_ki_to_stable(round(new_kp, 3), round(new_ki, 3))
+        if (new_kp, new_ki) != (k_p, k_i) and (new_kp, new_ki) not in candidates:
+            candidates.append((new_kp, new_ki))
+    return candidates
+
+def evaluate_candidate(creature, interface, duration, store):
+    """Function evaluating a candidate and storing its artifacts."""
+    creature.evaluate_data(interface, duration)
+    creature.commit_artifacts(store, f"{creature.get_name()}_{time.strftime('%Y%m%d-%H%M%S')}")
+
+def local_search(interface, duration, k_p, k_i, store):
+    """Function running local search around the current gains."""
+    #Ratings measured in the previous searches are stale by now
+    evaluate.Rating_table.clear()
+    evaluate.Checked_data.clear()
+    evaluate.Objectives_table.clear()
+    evaluate.Failure_table.clear()
+
+    reference = Creature(k_p, k_i)
+    evaluate_candidate(reference, interface, duration, store)
+    best = reference
+    for new_kp, new_ki in draw_neighbours(k_p, k_i):
+        candidate = Creature(new_kp, new_ki)
+        evaluate_candidate(candidate, interface, duration, store)
+        if candidate.rating < best.rating:
+            best = candidate
+    return reference, best
+
+def read_servo_gains(filename):
+    """Function reading k_p and k_i from the servo config file."""
+    gains = {}
+    if os.path.isfile(filename):
+        with open(filename, "r", encoding="utf-8") as servo_config:
+            for line in servo_config:
+                parts = line.split()
+                if len(parts) == 2 and parts[0] in {"pi_proportional_const",
+                                                    "pi_integral_const"}:
+                    try:
+                        gains[parts[0]] = float(parts[1])
+                    except ValueError:
+                        print(f"Skipping invalid line: {line}")
+    return gains.get("pi_proportional_const"), gains.get("pi_integral_const")
+
+def set_servo_gains(text, k_p, k_i):
+    """Function setting k_p and k_i in the servo config text."""
+    for option, value in (("pi_proportional_const", k_p), ("pi_integral_const", k_i)):
+        pattern = rf'^{option}\s+\S+\s*$'
+        if re.search(pattern, text, flags=re.MULTILINE):
+            text = re.sub(pattern, f"{option} {value}", text, flags=re.MULTILINE)
+        elif re.search(r'^\[global\]\s*$', text, flags=re.MULTILINE):
+            text = re.sub(r'^\[global\]\s*$', f"[global]\n{option} {value}", text,
+                          count=1, flags=re.MULTILINE)
+        else:
+            text = f"[global]\n{option} {value}\n" + text
+    return text
+
+def write_servo_config(text):
+    """Function writing the servo config and restarting the servo, returns error or None.
+
+    Config of None removes the config file."""
+    if text is None:
+        if os.path.isfile(config.daemon_servo_config):
+            os.remove(config.daemon_servo_config)
+    else:
+        with open(config.daemon_servo_config, "w", encoding="utf-8") as servo_config:
+            servo_config.write(text)
+    try:
+        subprocess.check_call(split(config.daemon_restart_cmd))
+    except (subprocess.SubprocessError, OSError) as error:
+        return f"Error calling {config.daemon_restart_cmd}: {error}"
+    return None
+
+def apply_gains(k_p, k_i):
+    """Function applying gains to the production servo, returns previous config and error.
+
+    Previous config is None if there was no config file."""
+    previous = None
+    if os.path.isfile(config.daemon_servo_config):
+        with open(config.daemon_servo_config, "r", encoding="utf-8") as servo_config:
+            previous = servo_config.read()
+    return previous, write_servo_config(set_servo_gains(previous or "", k_p, k_i))
+
+def retune(args, k_p, k_i, rating, store, logfilename):
+    """Function searching for better gains and applying them, returns gains in use."""
+    log_event(logfilename, f"Local search around k_p: {k_p} k_i: {k_i}")
+    reference, best = local_search(args.i, args.t, k_p, k_i, store)
+    log_event(logfilename, f"Reference score: {reference.rating} "
+                           f"best k_p: {best.k_p} k_i: {best.k_i} score: {best.rating}")
+    if best is reference or best.rating > reference.rating * (1 - config.daemon_min_improvement):
+        log_event(logfilename, "No candidate improves on the current gains")
+        return k_p, k_i, rating
+
+    start = os.path.getsize(config.daemon_log_file)
+    previous, error = apply_gains(best.k_p, best.k_i)
+    #The daemon keeps polling with the previous config if the servo cannot be restarted
+    if error:
+        log_event(logfilename, f"{error}, restoring k_p: {k_p} k_i: {k_i}")
+        error = write_servo_config(previous)
+        if error:
+            log_event(logfilename, error)
+        return k_p, k_i, rating
+    log_event(logfilename, f"Applied k_p: {best.k_p} k_i: {best.k_i}")
+    time.sleep(config.daemon_settle_time)
+
+    new_rating = rate_production(config.daemon_log_file, start)
+    if new_rating is None or new_rating > rating:
+        error = write_servo_config(previous)
+        log_event(logfilename, f"Regression (score {new_rating} vs {rating}), "
+                               f"rolled back to k_p: {k_p} k_i: {k_i}")
+        if error:
+            log_event(logfilename, error)
+        return k_p, k_i, rating
+
+    log_event(logfilename, f"Production score improved from {rating} to {new_rating}")
+    return best.k_p, best.k_i, new_rating
+
+def main(args):
+    """Main function."""
+    #Production logs are rated from the offsets of the locked servo, it does not converge again
+    if config.metric in CONVERGENCE_METRICS:
+        print(f"The {config.metric} metric cannot rate the production servo, "
+              f"specify one of: MSE, RMSE, MAE, MTIE, TDEV")
+        sys.exit()
+    timestr = time.strftime("%Y%m%d-%H%M%S")
+    result_path = f'./{config.app}_daemon_{timestr}'
+    os.makedirs(result_path, exist_ok=True)
+    logfilename = f'{result_path}/{config.app}_daemon.log'
+    store = ArtifactStore(result_path)
+
+    k_p, k_i = read_servo_gains(config.daemon_servo_config)
+    k_p = args.kp if args.kp is not None else (k_p if k_p is not None else 0.7)
+    k_i = args.ki if args.ki is not None else (k_i if k_i is not None else 0.3)
+    log_event(logfilename, f"Monitoring {config.daemon_log_file}, k_p: {k_p} k_i: {k_i}")
+
+    baseline = None
+    while True:
+        rating = rate_production(config.daemon_log_file)
+        if rating is None:
+            log_event(logfilename, "Production servo is not locked")
+        elif baseline is None or rating <= baseline:
+            baseline = rating
+        elif rating > baseline * (1 + config.daemon_degradation):
+            log_event(logfilename, f"Production score degraded from {baseline} to {rating}")
+            if in_maintenance_window():
+                k_p, k_i, baseline = retune(args, k_p, k_i, rating, store, logfilename)
+            else:
+                log_event(logfilename, "Outside of the maintenance window, search postponed")
+
+        time.sleep(config.daemon_poll_interval)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online re-tuning daemon for PTP servo")
+    parser.add_argument("--i", type=str, required=True,
+                        help="Interface used to evaluate candidates (spare port)")
+    parser.add_argument("--t", default=120, choices=range(1,9999), type=int,
+                        help="-t from PTP script", metavar="[1-9999]")
+    parser.add_argument("--kp", type=float, help="k_p currently used by the production servo")
+    parser.add_argument("--ki", type=float, help="k_i currently used by the production servo")
+
+    main(parser.parse_args())